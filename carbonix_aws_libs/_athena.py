@@ -0,0 +1,243 @@
+import hashlib
+import itertools
+import logging
+import random
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from carbonix_aws_libs._aws import _json_loads
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_QUERY_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+# Error codes Athena returns when a request is throttled; polling treats
+# these as "still running" for up to ATHENA_RETRY_WAIT_TIME seconds.
+THROTTLING_ERROR_CODES = ('ThrottlingException', 'TooManyRequestsException',
+                          'SlowDown')
+THROTTLED = 'THROTTLED'
+ATHENA_RETRY_WAIT_TIME = 60
+# Shortest sleep before the first status check of a query with a known
+# runtime, in seconds.
+MIN_EXPECTED_RUNTIME_SLEEP = 0.2
+
+
+def sql_string(value: Any) -> str:
+    """
+    Write a value as a quoted SQL string literal for ExecutionParameters.
+
+    :param value: The value to quote.
+    :return: The value quoted with single quotes, embedded quotes doubled.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _query_cache_key(query: str, execution_parameters: Optional[List[str]],
+                     max_results: Optional[int]) -> str:
+    """SHA-256 key of a query and its parameters for the result cache."""
+    return hashlib.sha256(repr(
+        (query, execution_parameters, max_results)).encode()).hexdigest()
+
+
+def _query_text_key(query: str) -> str:
+    """SHA-256 key of a query text alone, shared by all its parameters."""
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def _expected_runtime_sleep(expected_runtime: Optional[float]) -> float:
+    """How long to sleep before the first status check of a query."""
+    if not expected_runtime:
+        return 0
+    return max(MIN_EXPECTED_RUNTIME_SLEEP, 0.8 * expected_runtime)
+
+
+def _backoff_delay(attempt: int, base_delay: float, max_delay: float,
+                   throttled: bool = False) -> float:
+    """
+    Exponential backoff delay for a poll attempt, with up to 10% jitter.
+
+    The delay is doubled (beyond max_delay) after a throttled status check.
+    """
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    if throttled:
+        delay *= 2
+    return delay * (1 + random.random() * 0.1)
+
+
+class _QueryWait:
+    """
+    The status check schedule of one query, without the I/O.
+
+    Sleep first_delay, then pass each status check to next_delay and sleep
+    what it returns, until it returns None. succeeded is then the outcome:
+
+        wait = _QueryWait(query_execution_id, delay, base_delay,
+                          retry_wait_time, expected_runtime)
+        sleep = wait.first_delay
+        while sleep is not None:
+            time.sleep(sleep)
+            sleep = wait.next_delay(get_query_status(query_execution_id))
+        return wait.succeeded
+    """
+
+    def __init__(self, query_execution_id: str, delay: float,
+                 base_delay: float, retry_wait_time: float,
+                 expected_runtime: Optional[float] = None):
+        self.query_execution_id = query_execution_id
+        self.delay = delay
+        self.base_delay = base_delay
+        self.retry_wait_time = retry_wait_time
+        self.first_delay = _expected_runtime_sleep(expected_runtime)
+        self.succeeded = False
+        self._attempts = itertools.count()
+        self._throttled_since = None
+
+    def next_delay(self, status: Optional[str]) -> Optional[float]:
+        """
+        Take the latest status of the query.
+
+        :param status: The status, THROTTLED, or None if it could not be
+        retrieved.
+        :return: The delay before the next status check in seconds, or None
+        when the wait is over.
+        """
+        if status is None:
+            return None
+        if status in TERMINAL_QUERY_STATES:
+            self.succeeded = status == 'SUCCEEDED'
+            return None
+        throttled = status == THROTTLED
+        if throttled:
+            self._throttled_since = self._throttled_since or time.monotonic()
+            if (time.monotonic() - self._throttled_since >
+                    self.retry_wait_time):
+                logger.error("Gave up waiting for query %s: throttled",
+                             self.query_execution_id)
+                return None
+        else:
+            self._throttled_since = None
+        return _backoff_delay(next(self._attempts), self.base_delay,
+                              self.delay, throttled)
+
+
+def _row_values(row: Dict[str, Any]) -> List[Optional[str]]:
+    """
+    Return the cell values of a GetQueryResults row.
+
+    Athena leaves VarCharValue out of NULL cells; those become None.
+    """
+    return [cell.get('VarCharValue') for cell in row.get('Data', [])]
+
+
+def _result_rows(results: Optional[Dict[str, Any]]
+                 ) -> List[List[Optional[str]]]:
+    """Return the rows of a GetQueryResults page, header row first."""
+    return [_row_values(row)
+            for row in (results or {}).get('ResultSet', {}).get('Rows', [])]
+
+
+def _is_negative_result(results: Optional[Dict[str, Any]]) -> bool:
+    """
+    Whether a GetQueryResults page has no rows or only a negative one.
+
+    Such results, e.g. the false of an existence check, can change as soon
+    as data is ingested, so they are not kept in the result cache.
+    """
+    rows = _result_rows(results)
+    # The first row is the header
+    if len(rows) < 2:
+        return True
+    return len(rows) == 2 and all(
+        value in (None, '', '0', 'false') for value in rows[1])
+
+
+def _first_row_value(results: Optional[Dict[str, Any]],
+                     index: int) -> Optional[str]:
+    """Return a column of the first data row of a GetQueryResults page."""
+    rows = _result_rows(results)
+    # The first row is the header
+    if len(rows) > 1 and len(rows[1]) > index:
+        return rows[1][index]
+    return None
+
+
+def _parse_flight_data(results: Optional[Dict[str, Any]]
+                       ) -> Optional[Dict[str, Any]]:
+    """Convert the first data row of a flight data query to a dict."""
+    rows = _result_rows(results)
+    if len(rows) > 1 and len(rows[1]) > 10:
+        # Pilot and GSO are None when no such message was logged.
+        data = rows[1]
+        return {
+            'TakeoffTimestamp': data[0],
+            'TakeoffTimestampStr': data[1],
+            'TakeoffLat': data[2],
+            'TakeoffLong': data[3],
+            'Pilot': data[4],
+            'GSO': data[5],
+            'LandingTimestamp': data[6],
+            'LandingTimestampStr': data[7],
+            'LandingLat': data[8],
+            'LandingLong': data[9],
+            'TotalFlightTime': data[10]
+        }
+    return None
+
+
+def _parse_value_stats(rows: Iterable[List[str]]
+                       ) -> Optional[Dict[str, Dict[str, Dict[str, float]]]]:
+    """
+    Convert value stats rows, header row first, to a dict by instance of
+    dicts by keyname.
+    """
+    stats = {}
+    # Skip the header row
+    for row in itertools.islice(rows, 1, None):
+        stats.setdefault(row[3], {})[row[2]] = {
+            'min': float(row[4]),
+            'max': float(row[5]),
+            'avg': float(row[6])
+        }
+    return stats or None
+
+
+def _parse_unloaded_value_stats(rows: Iterable[Dict[str, Any]]
+                                ) -> Optional[Dict[str, Dict[str,
+                                                             Dict[str,
+                                                                  float]]]]:
+    """Like _parse_value_stats, for the rows of an UNLOAD of the query."""
+    stats = {}
+    for row in rows:
+        stats.setdefault(row['instance'], {})[row['keyname']] = {
+            'min': float(row['min_value']),
+            'max': float(row['max_value']),
+            'avg': float(row['avg_value'])
+        }
+    return stats or None
+
+
+def _split_s3_uri(uri: str) -> Tuple[str, str]:
+    """Split an s3://bucket/key URI into the bucket and the key."""
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def _unload_query(query: str, output_location: str) -> Tuple[str, str]:
+    """
+    Wrap a SELECT query in an UNLOAD to gzipped JSON lines.
+
+    :param query: The SELECT query.
+    :param output_location: The S3 URI under which a new, empty prefix is
+    chosen for the files.
+    :return: The UNLOAD query and the S3 URI of its prefix.
+    """
+    location = f"{output_location.rstrip('/')}/unload/{uuid.uuid4()}/"
+    unload = (f"UNLOAD ({query.strip().rstrip(';')})\n"
+              f"TO '{location}'\n"
+              f"WITH (format = 'JSON', compression = 'GZIP')")
+    return unload, location
+
+
+def _json_lines(lines: Iterable[bytes]) -> List[Any]:
+    """Parse the non-blank lines of a JSON lines file."""
+    return [_json_loads(line) for line in lines if line.strip()]
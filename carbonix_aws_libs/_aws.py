@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+try:
+    import orjson
+except ImportError:  # optional, installed with the "fast" extra
+    orjson = None
+
+# Enough pooled connections for execute_queries fan-out, and adaptive
+# retries so throttled calls back off instead of failing.
+CLIENT_CONFIG = Config(max_pool_connections=50,
+                       retries={'max_attempts': 10, 'mode': 'adaptive'},
+                       tcp_keepalive=True)
+# S3 fans out further, for directory uploads and folder listings, and gives
+# up on a stalled connection sooner than the default 60 s timeouts.
+S3_CLIENT_CONFIG = CLIENT_CONFIG.merge(Config(max_pool_connections=64,
+                                              connect_timeout=3,
+                                              read_timeout=30))
+# Configs of the services that do not use CLIENT_CONFIG as it is.
+_SERVICE_CLIENT_CONFIGS = {'s3': S3_CLIENT_CONFIG}
+
+# Clients shared by all handlers, keyed by service and region. boto3
+# clients are thread-safe, and sharing them saves loading the service model
+# and reconnecting every time a handler is created.
+_CLIENTS: Dict[Tuple[str, Optional[str]], Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+# orjson parses JSON several times faster than json when it is installed.
+_json_loads = orjson.loads if orjson else json.loads
+
+
+def _get_client(service_name: str, region_name: Optional[str]) -> Any:
+    """Return the shared boto3 client for a service and region."""
+    key = (service_name, region_name)
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            config = _SERVICE_CLIENT_CONFIGS.get(service_name, CLIENT_CONFIG)
+            _CLIENTS[key] = boto3.client(service_name,
+                                         region_name=region_name,
+                                         config=config)
+        return _CLIENTS[key]
+
+
+class _LRUCache:
+    """A small thread-safe LRU cache whose entries expire after ttl."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            stored_at, value = entry
+            if (self.ttl is not None and
+                    time.monotonic() - stored_at > self.ttl):
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
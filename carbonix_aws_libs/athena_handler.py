@@ -1,41 +1,229 @@
+import codecs
+import csv
+import gzip
+import itertools
 import logging
+import re
+import threading
 import time
-from typing import Any, Dict, Optional
-import boto3
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional, Tuple
 from botocore.exceptions import ClientError
 from typing import List
 
+from carbonix_aws_libs._athena import (
+    ATHENA_RETRY_WAIT_TIME, TERMINAL_QUERY_STATES, THROTTLED,
+    THROTTLING_ERROR_CODES, _QueryWait, _backoff_delay, _first_row_value,
+    _is_negative_result, _json_lines, _parse_flight_data,
+    _parse_unloaded_value_stats, _parse_value_stats, _query_cache_key,
+    _query_text_key, _result_rows, _row_values, _split_s3_uri, _unload_query,
+    sql_string)
+from carbonix_aws_libs._aws import _LRUCache, _get_client
+
+__all__ = ['AthenaHandler', 'sql_string']
+
 logger = logging.getLogger(__name__)
 
+# BatchGetQueryExecution accepts at most 50 query execution IDs per call.
+BATCH_GET_QUERY_LIMIT = 50
+# Number of partitions added by a single ALTER TABLE ADD PARTITION statement.
+PARTITIONS_PER_QUERY = 100
+# Glue BatchCreatePartition accepts at most 100 partitions per call.
+GLUE_PARTITIONS_PER_CALL = 100
+# Partition columns of the table, in the order of the partition folders.
+PARTITION_KEYS = ('loguid', 'messagetype', 'instance', 'keyname')
+# Where the position and crew (pilot and GSO) messages of a flight are
+# logged, by log type: (messagetype, instance, keynames). An instance of
+# None matches any instance.
+FLIGHT_MESSAGE_SOURCES = {
+    'bin': {'position': ('GPS', '0', ['Lat', 'Lng']),
+            'crew': ('MSG', '0', ['Message'])},
+    'tlog': {'position': ('GLOBAL_POSITION_INT', '1', ['lat', 'lon']),
+             'crew': ('STATUSTEXT', None, ['text'])},
+}
+
+# Size and lifetime (seconds) of the per-handler cache of lookups such as
+# check_loguid_exists and get_boot_time.
+LOOKUP_CACHE_SIZE = 4096
+LOOKUP_CACHE_TTL = 3600
+# Number of run_query results kept in memory. They are kept for as long as
+# Athena would reuse the result (result_reuse_max_age_minutes).
+QUERY_RESULT_CACHE_SIZE = 512
+# Weight of the latest run in the moving mean runtime of each query text.
+RUNTIME_SMOOTHING = 0.2
+
+_PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+# Matched from the start of the normalized folder path.
+_PARTITION_PATH_RE = re.compile(
+    r'loguid=([^/]+)/messagetype=([^/]+)/instance=([^/]+)/keyname=([^/\s]+)',
+    re.IGNORECASE)
+# One PARTITION clause of ALTER TABLE ADD, from the partition values, the
+# bucket and the folder.
+_PARTITION_CLAUSE = ("PARTITION (loguid='{0}', messagetype='{1}', "
+                     "instance='{2}', keyname='{3}')\n"
+                     "LOCATION 's3://{4}/{5}'")
+
+
+def _parse_partition_folders(partition_list: list
+                             ) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+    """
+    Parse partition folder paths, skipping any that cannot be parsed.
+
+    :param partition_list: Folder paths containing
+    loguid=.../messagetype=.../instance=.../keyname=...
+    :return: An iterator of (normalized folder, partition values) pairs,
+    with the values in the order of PARTITION_KEYS.
+    """
+    for folder in partition_list:
+        # Normalize folder path to use forward slashes
+        folder = folder.replace("\\", "/").lstrip("/").rstrip()
+        match = _PARTITION_PATH_RE.match(folder)
+        if not match:
+            logger.error("Error parsing folder path: %s", folder)
+            continue
+        yield folder, match.groups()
+
+
+def _bind_parameters(query: str, **values: Any) -> Tuple[str, List[str]]:
+    """
+    Replace the {name} fields of a query template with ? placeholders.
+
+    Each field becomes one placeholder per occurrence, and a list value
+    becomes a comma separated placeholder per item, e.g. for an IN list.
+    Numbers are passed as numeric literals and anything else as a string.
+
+    :param query: The query template.
+    :param values: The value of each field.
+    :return: The query text and its execution parameters, in order.
+    """
+    execution_parameters = []
+
+    def literal(value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return sql_string(value)
+
+    def placeholders(match):
+        value = values[match.group(1)]
+        items = value if isinstance(value, (list, tuple)) else [value]
+        execution_parameters.extend(literal(item) for item in items)
+        return ', '.join('?' * len(items))
+
+    return _PLACEHOLDER_RE.sub(placeholders, query), execution_parameters
+
+
+def _pad_to_power_of_two(items: List[Any]) -> List[Any]:
+    """
+    Pad a list to the next power of two length by repeating its last item.
+
+    A query with one placeholder per item then has the same text for any
+    number of items up to that length, so its result reuse and runtime
+    statistics are shared. Repeated items do not change an IN list.
+    """
+    if not items:
+        return items
+    size = 1 << (len(items) - 1).bit_length()
+    return items + items[-1:] * (size - len(items))
+
 
 class AthenaHandler:
     def __init__(self, database: str, output_location: Optional[str] = None,
-                 region_name: Optional[str] = 'ap-southeast-2'):
-        self.athena_client = boto3.client('athena', region_name=region_name)
+                 region_name: Optional[str] = 'ap-southeast-2',
+                 result_reuse_max_age_minutes: Optional[int] = 60):
+        self.athena_client = _get_client('athena', region_name)
+        self.s3_client = _get_client('s3', region_name)
+        self.glue_client = _get_client('glue', region_name)
         self.database = database
+        # database may be given as "database.table"; Glue needs the parts.
+        self.database_name, _, self.table_name = database.partition('.')
         self.output_location = output_location
+        # Athena returns the result of an identical query run within this
+        # many minutes without running it again. Set to None to disable.
+        self.result_reuse_max_age_minutes = result_reuse_max_age_minutes
+        self._lookup_cache = _LRUCache(LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL)
+        self._result_cache = _LRUCache(
+            QUERY_RESULT_CACHE_SIZE, (result_reuse_max_age_minutes or 0) * 60)
+        # Moving mean runtime in seconds of each query text, by SHA-256.
+        self._mean_runtime = _LRUCache(QUERY_RESULT_CACHE_SIZE)
+        # Futures of the run_query calls in progress, by query cache key.
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        # When add_partitions last added partitions, as time.monotonic().
+        self._partitions_added_at: Optional[float] = None
+
+    def clear_cache(self) -> None:
+        """Forget all cached lookup and query results."""
+        self._lookup_cache.clear()
+        self._result_cache.clear()
 
-    def execute_query(self, query: str) -> Optional[str]:
+    def _record_runtime(self, runtime_key: str, runtime: float) -> None:
+        """Fold the runtime of a completed query into its moving mean."""
+        mean = self._mean_runtime.get(runtime_key)
+        if mean is not None:
+            runtime = ((1 - RUNTIME_SMOOTHING) * mean +
+                       RUNTIME_SMOOTHING * runtime)
+        self._mean_runtime.put(runtime_key, runtime)
+
+    def _reuse_max_age_minutes(self) -> Optional[int]:
+        """
+        The age of the oldest query result that may be reused.
+
+        After add_partitions, only results from after it are reused, so a
+        query does not miss the data of the new partitions.
+        """
+        max_age = self.result_reuse_max_age_minutes
+        if max_age and self._partitions_added_at is not None:
+            max_age = min(max_age, int(
+                (time.monotonic() - self._partitions_added_at) // 60))
+        return max_age
+
+    def _start_query_execution_params(
+            self, query: str, reuse_results: bool,
+            execution_parameters: Optional[List[str]]) -> Dict[str, Any]:
+        """Build the StartQueryExecution arguments for a query."""
+        params = {
+            'QueryString': query,
+            'QueryExecutionContext': {'Database': self.database}
+        }
+        if self.output_location:
+            params['ResultConfiguration'] = {
+                'OutputLocation': self.output_location}
+        if execution_parameters:
+            params['ExecutionParameters'] = execution_parameters
+        max_age = self._reuse_max_age_minutes()
+        if reuse_results and max_age:
+            params['ResultReuseConfiguration'] = {
+                'ResultReuseByAgeConfiguration': {
+                    'Enabled': True,
+                    'MaxAgeInMinutes': max_age
+                }
+            }
+        return params
+
+    def execute_query(self, query: str,
+                      reuse_results: bool = True,
+                      execution_parameters: Optional[List[str]] = None
+                      ) -> Optional[str]:
         """
         Execute an Athena query.
 
         :param query: The SQL query to execute.
+        :param execution_parameters: Values for the ? placeholders in the
+        query, in order, written as SQL literals (see sql_string).
+        :param reuse_results: Allow Athena to return a recent cached result
+        of the same query. Only affects SELECT queries; pass False for
+        queries that must observe writes made since the last run.
         :return: The query execution ID or None if an error occurs.
         """
         try:
-            params = {
-                'QueryString': query,
-                'QueryExecutionContext': {'Database': self.database}
-            }
-            if self.output_location:
-                params['ResultConfiguration'] = {
-                    'OutputLocation': self.output_location}
+            params = self._start_query_execution_params(
+                query, reuse_results, execution_parameters)
             response = self.athena_client.start_query_execution(**params)
             query_execution_id = response['QueryExecutionId']
-            logger.debug(f"{query_execution_id}")
+            logger.debug("%s", query_execution_id)
             return query_execution_id
         except ClientError as e:
-            logger.error(f"{e}")
+            logger.error("%s", e)
             return None
 
     def get_query_status(self, query_execution_id: str) -> Optional[str]:
@@ -43,119 +231,572 @@ class AthenaHandler:
         Get the status of an Athena query.
 
         :param query_execution_id: The ID of the query execution.
-        :return: The status of the query or None if an error occurs.
+        :return: The status of the query, THROTTLED if Athena throttled the
+        request, or None if an error occurs.
         """
         try:
             response = self.athena_client.get_query_execution(
                 QueryExecutionId=query_execution_id)
             status = response['QueryExecution']['Status']['State']
-            logger.debug(f"Query {query_execution_id} status: {status}")
+            logger.debug("Query %s status: %s", query_execution_id, status)
             return status
         except ClientError as e:
-            logger.error(f"Error getting query status: {e}")
+            if e.response['Error']['Code'] in THROTTLING_ERROR_CODES:
+                logger.warning("Query status check throttled: %s", e)
+                return THROTTLED
+            logger.error("Error getting query status: %s", e)
             return None
 
+    def get_query_statuses(self, query_execution_ids: List[str]
+                           ) -> Optional[Dict[str, str]]:
+        """
+        Get the status of several Athena queries.
+
+        Uses BatchGetQueryExecution, which returns up to 50 queries per
+        call, instead of one GetQueryExecution call per query.
+
+        :param query_execution_ids: The IDs of the query executions.
+        :return: A mapping of query execution ID to status, or None if an
+        error occurs. IDs Athena could not process are left out, and IDs
+        whose request was throttled are mapped to THROTTLED.
+        """
+        statuses = {}
+        for start in range(0, len(query_execution_ids),
+                           BATCH_GET_QUERY_LIMIT):
+            chunk = query_execution_ids[start:start + BATCH_GET_QUERY_LIMIT]
+            try:
+                response = self.athena_client.batch_get_query_execution(
+                    QueryExecutionIds=chunk)
+            except ClientError as e:
+                if e.response['Error']['Code'] in THROTTLING_ERROR_CODES:
+                    logger.warning("Query status check throttled: %s", e)
+                    statuses.update(dict.fromkeys(chunk, THROTTLED))
+                    continue
+                logger.error("Error getting query statuses: %s", e)
+                return None
+            for execution in response.get('QueryExecutions', []):
+                statuses[execution['QueryExecutionId']] = (
+                    execution['Status']['State'])
+            for unprocessed in response.get('UnprocessedQueryExecutionIds',
+                                            []):
+                logger.error("Error getting query status: %s", unprocessed)
+        return statuses
+
     def wait_for_query_to_complete(self, query_execution_id: str,
-                                   delay: int = 5) -> bool:
+                                   delay: float = 5,
+                                   base_delay: float = 0.1,
+                                   retry_wait_time: float =
+                                   ATHENA_RETRY_WAIT_TIME,
+                                   expected_runtime: Optional[float] = None
+                                   ) -> bool:
         """
         Wait for an Athena query to complete.
 
+        Status checks back off exponentially with jitter, starting at
+        base_delay and doubling up to delay, so short queries return quickly
+        while long queries are not polled more often than needed. Throttled
+        status checks double the next delay and are retried for up to
+        retry_wait_time seconds. When the usual runtime of the query is
+        known, most of it is slept up front instead of being polled through.
+
         :param query_execution_id: The ID of the query execution.
-        :param delay: The delay between status checks in seconds.
+        :param delay: The maximum delay between status checks in seconds.
+        :param base_delay: The delay before the first re-check in seconds.
+        :param retry_wait_time: How long to keep retrying while throttled.
+        :param expected_runtime: The usual runtime of the query in seconds.
         :return: True if the query completed successfully, False otherwise.
         """
-        while True:
-            status = self.get_query_status(query_execution_id)
-            if status in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                return status == 'SUCCEEDED'
-            time.sleep(delay)
+        wait = _QueryWait(query_execution_id, delay, base_delay,
+                          retry_wait_time, expected_runtime)
+        sleep = wait.first_delay
+        while sleep is not None:
+            time.sleep(sleep)
+            sleep = wait.next_delay(self.get_query_status(query_execution_id))
+        return wait.succeeded
+
+    def wait_for_queries_to_complete(self, query_execution_ids: List[str],
+                                     delay: float = 5,
+                                     base_delay: float = 0.1,
+                                     retry_wait_time: float =
+                                     ATHENA_RETRY_WAIT_TIME
+                                     ) -> Dict[str, bool]:
+        """
+        Wait for several Athena queries to complete.
+
+        All pending queries are polled with one batched status call per
+        round, and completed queries are dropped from the next round.
 
-    def get_query_results(self,
-                          query_execution_id: str) -> Optional[Dict[str, Any]]:
+        :param query_execution_ids: The IDs of the query executions.
+        :param delay: The maximum delay between status checks in seconds.
+        :param base_delay: The delay before the first re-check in seconds.
+        :param retry_wait_time: How long to keep retrying while throttled.
+        :return: A mapping of query execution ID to True if the query
+        completed successfully, False otherwise.
+        """
+        completed = {qid: False for qid in query_execution_ids}
+        pending = set(query_execution_ids)
+        throttled_since = None
+        for attempt in itertools.count():
+            if not pending:
+                break
+            statuses = self.get_query_statuses(list(pending))
+            if statuses is None:
+                break
+            throttled = False
+            for qid in list(pending):
+                status = statuses.get(qid)
+                if status == THROTTLED:
+                    throttled = True
+                elif status is None or status in TERMINAL_QUERY_STATES:
+                    logger.debug("Query %s status: %s", qid, status)
+                    completed[qid] = status == 'SUCCEEDED'
+                    pending.discard(qid)
+            if throttled:
+                throttled_since = throttled_since or time.monotonic()
+                if time.monotonic() - throttled_since > retry_wait_time:
+                    logger.error("Gave up waiting for queries: throttled")
+                    break
+            else:
+                throttled_since = None
+            if pending:
+                time.sleep(_backoff_delay(attempt, base_delay, delay,
+                                          throttled))
+        return completed
+
+    def execute_queries(self, queries: List[str], max_workers: int = 8,
+                        delay: float = 5, base_delay: float = 0.1,
+                        reuse_results: bool = True,
+                        execution_parameters: Optional[
+                            List[Optional[List[str]]]] = None
+                        ) -> List[Optional[str]]:
+        """
+        Execute several Athena queries concurrently and wait for all of them.
+
+        The queries are submitted in parallel and then waited on together
+        with wait_for_queries_to_complete, so a batch completes in about the
+        time of its slowest query.
+
+        :param queries: The SQL queries to execute.
+        :param max_workers: The maximum number of concurrent submissions.
+        :param delay: The maximum delay between status checks in seconds.
+        :param base_delay: The delay before the first re-check in seconds.
+        :param reuse_results: Allow Athena to return recent cached results.
+        :param execution_parameters: The ? placeholder values of each query,
+        in the order of the queries.
+        :return: The query execution IDs in the order of the queries, with
+        None for any query that could not be started or did not succeed.
+        """
+        if not queries:
+            return []
+        if execution_parameters is None:
+            execution_parameters = [None] * len(queries)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            query_execution_ids = list(executor.map(
+                lambda query, params: self.execute_query(
+                    query, reuse_results, params),
+                queries, execution_parameters))
+
+        completed = self.wait_for_queries_to_complete(
+            [qid for qid in query_execution_ids if qid], delay, base_delay)
+        return [qid if completed.get(qid) else None
+                for qid in query_execution_ids]
+
+    def get_query_results(self, query_execution_id: str,
+                          max_results: Optional[int] = None
+                          ) -> Optional[Dict[str, Any]]:
         """
         Retrieve the results of an Athena query.
 
         :param query_execution_id: The ID of the query execution.
+        :param max_results: The maximum number of rows to return, including
+        the header row. Athena returns up to 1000 rows when not set.
         :return: The query results or None if an error occurs.
         """
         try:
-            response = self.athena_client.get_query_results(
-                QueryExecutionId=query_execution_id)
+            params = {'QueryExecutionId': query_execution_id}
+            if max_results:
+                params['MaxResults'] = max_results
+            response = self.athena_client.get_query_results(**params)
             return response
         except ClientError as e:
-            logger.error(f"Error getting query results: {e}")
+            logger.error("Error getting query results: %s", e)
+            return None
+
+    def iter_query_results(self, query_execution_id: str,
+                           page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over all result rows of an Athena query, page by page.
+
+        Unlike get_query_results, this follows NextToken past the first 1000
+        rows. Pages are only requested as the rows are consumed, so a caller
+        that stops early does not fetch the rest.
+
+        :param query_execution_id: The ID of the query execution.
+        :param page_size: The number of rows requested per page.
+        :return: An iterator over the rows, starting with the header row.
+        The iteration stops early if a page cannot be retrieved.
+        """
+        paginator = self.athena_client.get_paginator('get_query_results')
+        try:
+            for page in paginator.paginate(
+                    QueryExecutionId=query_execution_id,
+                    PaginationConfig={'PageSize': page_size}):
+                yield from page['ResultSet'].get('Rows', [])
+        except ClientError as e:
+            logger.error("Error getting query results: %s", e)
+
+    def run_query(self, query: str, max_results: Optional[int] = None,
+                  poll_base: float = 0.1, poll_cap: float = 5,
+                  execution_parameters: Optional[List[str]] = None,
+                  reuse_results: bool = True
+                  ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Execute an Athena query, wait for it and retrieve its results.
+
+        The results are requested as soon as the query is seen to succeed.
+        When reuse_results is set, the results are also kept in memory,
+        keyed by a SHA-256 of the query, so repeating the query within
+        result_reuse_max_age_minutes makes no Athena calls at all. The
+        runtime of each query text is tracked as well, so later runs of it,
+        whatever their parameters, sleep through most of that time before
+        the first status check.
+
+        Concurrent calls with the same query, parameters and max_results
+        share one execution: the first call runs the query and the others
+        wait for its result instead of starting their own. This does not
+        apply when reuse_results is not set.
+
+        :param query: The SQL query to execute.
+        :param max_results: The maximum number of rows to return, including
+        the header row.
+        :param poll_base: The delay before the first status re-check.
+        :param poll_cap: The maximum delay between status checks.
+        :param execution_parameters: Values for the ? placeholders.
+        :param reuse_results: Allow Athena to return a recent cached result.
+        :return: The query execution ID and the query results; either is
+        None if the query could not be started or did not succeed.
+        """
+        if not reuse_results:
+            return self._run_query_once(query, max_results, poll_base,
+                                        poll_cap, execution_parameters,
+                                        reuse_results)
+        cache_key = _query_cache_key(query, execution_parameters,
+                                     max_results)
+        cached = self._cached_result(cache_key)
+        if cached is not None:
+            return cached
+
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            is_leader = future is None
+            if is_leader:
+                future = self._inflight[cache_key] = Future()
+        if not is_leader:
+            return future.result()
+        try:
+            result = self._run_query_once(query, max_results, poll_base,
+                                          poll_cap, execution_parameters,
+                                          reuse_results, cache_key)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[cache_key]
+
+    def _run_query_once(self, query: str, max_results: Optional[int],
+                        poll_base: float, poll_cap: float,
+                        execution_parameters: Optional[List[str]],
+                        reuse_results: bool,
+                        cache_key: Optional[str] = None
+                        ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Execute, wait for and fetch one query for run_query.
+
+        The results are stored in the result cache under cache_key when it
+        is given, see _cache_result.
+        """
+        runtime_key = _query_text_key(query)
+        started = time.monotonic()
+        query_execution_id = self.execute_query(query, reuse_results,
+                                                execution_parameters)
+        if not query_execution_id:
+            return None, None
+        if not self.wait_for_query_to_complete(
+                query_execution_id, poll_cap, poll_base,
+                expected_runtime=self._mean_runtime.get(runtime_key)):
+            return query_execution_id, None
+        self._record_runtime(runtime_key, time.monotonic() - started)
+        results = self.get_query_results(query_execution_id, max_results)
+        if cache_key:
+            self._cache_result(cache_key, query_execution_id, results)
+        return query_execution_id, results
+
+    def _cached_result(self, cache_key: str
+                       ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return the cached run_query result of a query, if any."""
+        if not self.result_reuse_max_age_minutes:
             return None
+        return self._result_cache.get(cache_key)
+
+    def _cache_result(self, cache_key: str, query_execution_id: str,
+                      results: Optional[Dict[str, Any]]) -> None:
+        """
+        Keep a run_query result while result reuse is enabled, unless it is
+        empty or negative (see _is_negative_result).
+        """
+        if (self.result_reuse_max_age_minutes and results is not None and
+                not _is_negative_result(results)):
+            self._result_cache.put(cache_key, (query_execution_id, results))
+
+    def get_query_results_s3(self, query_execution_id: str
+                             ) -> Optional[List[List[str]]]:
+        """
+        Retrieve the results of an Athena query from its S3 output file.
+
+        Reading the CSV Athena already wrote is a single S3 GET, instead of
+        one GetQueryResults call per 1000 rows, so prefer this for queries
+        with large result sets. Values are returned as strings.
+
+        :param query_execution_id: The ID of the query execution.
+        :return: The result rows, header row first, or None if an error
+        occurs.
+        """
+        try:
+            response = self.athena_client.get_query_execution(
+                QueryExecutionId=query_execution_id)
+            bucket, key = _split_s3_uri(
+                response['QueryExecution']['ResultConfiguration']
+                ['OutputLocation'])
+            body = self.s3_client.get_object(Bucket=bucket, Key=key)['Body']
+            return list(csv.reader(codecs.getreader('utf-8')(body)))
+        except (ClientError, KeyError) as e:
+            logger.error("Error getting query results from S3: %s", e)
+            return None
+
+    def unload_query_results(self, query: str,
+                             execution_parameters: Optional[List[str]] = None
+                             ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Run a SELECT query as an UNLOAD and read the rows it wrote to S3.
+
+        UNLOAD writes gzipped JSON lines under a new prefix of
+        output_location instead of a CSV result set, so numbers arrive
+        typed and no GetQueryResults pages are needed. The files are left in
+        place, like other query results.
+
+        :param query: The SELECT query to run.
+        :param execution_parameters: Values for the ? placeholders.
+        :return: The rows as dicts keyed by column name, or None if no
+        output_location is set or an error occurs.
+        """
+        if not self.output_location:
+            return None
+        unload, location = _unload_query(query, self.output_location)
+        # UNLOAD results are never reused, and need an empty prefix.
+        query_execution_id = self.execute_query(unload, False,
+                                                execution_parameters)
+        if not (query_execution_id and
+                self.wait_for_query_to_complete(query_execution_id)):
+            return None
+        bucket, prefix = _split_s3_uri(location)
+        rows = []
+        try:
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                for obj in page.get('Contents', []):
+                    body = self.s3_client.get_object(
+                        Bucket=bucket, Key=obj['Key'])['Body']
+                    with gzip.GzipFile(fileobj=body) as lines:
+                        rows.extend(_json_lines(lines))
+        except (ClientError, OSError, ValueError) as e:
+            logger.error("Error reading UNLOAD results from S3: %s", e)
+            return None
+        return rows
+
+    def check_loguid_partition_exists(self, loguid: str) -> Optional[bool]:
+        """
+        Check the Glue catalog for a partition of a specific loguid.
+
+        This is a single metadata call with no data scanned, since loguid is
+        a partition key of the table. Only a positive answer is conclusive:
+        with partition projection, or before the partitions of new data are
+        registered, the catalog has no partitions for a loguid that exists.
+
+        :param loguid: The loguid to check.
+        :return: True if a partition exists, False if not, or None if the
+        catalog could not be queried.
+        """
+        if not self.table_name:
+            return None
+        try:
+            response = self.glue_client.get_partitions(
+                **self._loguid_partitions_params(loguid))
+            return len(response.get('Partitions', [])) > 0
+        except ClientError as e:
+            logger.error("Error getting partitions from Glue: %s", e)
+            return None
+
+    def _loguid_partitions_params(self, loguid: str) -> Dict[str, Any]:
+        """Build the GetPartitions arguments to look up one loguid."""
+        return {
+            'DatabaseName': self.database_name,
+            'TableName': self.table_name,
+            'Expression': f"loguid = {sql_string(loguid)}",
+            'MaxResults': 1
+        }
+
+    def get_loguid_exists_query(self) -> str:
+        """
+        Generate SQL query to check if a loguid exists in the Athena table.
+
+        The query returns a single boolean cell, 'true' or 'false'.
+
+        :return: SQL query string, taking the loguid as its only parameter
+        """
+        return f"""
+        SELECT EXISTS (
+            SELECT 1
+            FROM {self.database}
+            WHERE loguid = ?
+            LIMIT 1
+        ) AS loguid_exists;
+        """
 
     def check_loguid_exists(self, loguid: str) -> bool:
         """
         Check if a specific loguid exists in the Athena table.
 
+        The Glue catalog is checked first; the Athena query is only run if
+        the catalog has no partition for the loguid or cannot be queried. A
+        loguid found to exist is cached, since logs are not removed from the
+        table.
+
         :param loguid: The loguid to check.
         :return: True if the loguid exists, False otherwise.
         """
-        query = f"""
-        SELECT loguid
-        FROM {self.database}
-        WHERE loguid = '{loguid}'
-        LIMIT 1;
+        cache_key = ('check_loguid_exists', loguid)
+        if self._lookup_cache.get(cache_key):
+            return True
+        exists = self._query_loguid_exists(loguid)
+        if exists:
+            self._lookup_cache.put(cache_key, True)
+        return exists
+
+    def check_loguids_exist(self, loguids: List[str],
+                            max_workers: int = 8) -> Dict[str, bool]:
         """
-        query_execution_id = self.execute_query(query)
-        if not query_execution_id:
-            return False
-        query_completed = self.wait_for_query_to_complete(query_execution_id)
-        if query_completed:
-            results = self.get_query_results(query_execution_id)
-            if results and 'ResultSet' in results and (
-                    'Rows' in results['ResultSet']):
-                # The first row is the header
-                return len(results['ResultSet']['Rows']) > 1
-        return False
+        Check which of several loguids exist in the Athena table.
+
+        Like check_loguid_exists, but the Athena queries for loguids that
+        the Glue catalog does not find are submitted together and waited on
+        with a single batched status poll.
+
+        :param loguids: The loguids to check.
+        :param max_workers: The maximum number of concurrent requests.
+        :return: A mapping of loguid to True if it exists, False otherwise.
+        """
+        exists = {}
+        unknown = []
+        for loguid in dict.fromkeys(loguids):
+            if self._lookup_cache.get(('check_loguid_exists', loguid)):
+                exists[loguid] = True
+                continue
+            exists[loguid] = self.check_loguid_partition_exists(loguid)
+            if not exists[loguid]:
+                unknown.append(loguid)
+
+        if unknown:
+            query = self.get_loguid_exists_query()
+            query_execution_ids = self.execute_queries(
+                [query] * len(unknown), max_workers, reuse_results=False,
+                execution_parameters=[[sql_string(loguid)]
+                                      for loguid in unknown])
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # The result is the header row and one boolean row.
+                all_results = list(executor.map(
+                    lambda qid: qid and self.get_query_results(qid, 2),
+                    query_execution_ids))
+            for loguid, results in zip(unknown, all_results):
+                exists[loguid] = _first_row_value(results, 0) == 'true'
+
+        for loguid, loguid_exists in exists.items():
+            if loguid_exists:
+                self._lookup_cache.put(('check_loguid_exists', loguid), True)
+        return exists
+
+    def _query_loguid_exists(self, loguid: str) -> bool:
+        """Look up whether a loguid exists, without the lookup cache."""
+        if self.check_loguid_partition_exists(loguid):
+            return True
+        # The result is the header row and one boolean row. It is never
+        # reused, as the loguid may have been added since.
+        _, results = self.run_query(
+            self.get_loguid_exists_query(), max_results=2,
+            execution_parameters=[sql_string(loguid)], reuse_results=False)
+        return _first_row_value(results, 0) == 'true'
 
     def get_boot_time(self, loguid: str,
                       file_type: str) -> Optional[Dict[str, Any]]:
         """
         get boot time from the Athena table based on the loguid.
 
+        Boot times that are found are cached per loguid and file type.
+
         :param loguid: The loguid to get boot time for.
         :file_type: The log type to get data for.
         :return: The boot time or None if an error occurs.
         """
+        cache_key = ('get_boot_time', loguid, file_type)
+        boot_time = self._lookup_cache.get(cache_key)
+        if boot_time is None:
+            boot_time = self._query_boot_time(loguid, file_type)
+            if boot_time is not None:
+                self._lookup_cache.put(cache_key, boot_time)
+        return boot_time
+
+    def get_boot_time_query(self, file_type: str) -> Optional[str]:
+        """
+        Generate SQL query to retrieve the boot time of a log.
 
+        :param file_type: The log type, ".BIN" or ".TLOG".
+        :return: SQL query string, taking the loguid as its only parameter,
+        or None for an unknown log type
+        """
         if file_type == ".BIN":
-            query = f"""
+            return f"""
             SELECT loguid, timestamp
             FROM {self.database}
-            WHERE loguid = '{loguid}'
+            WHERE loguid = ?
             AND (MessageType = 'FMT')
             AND (KeyName = 'Type')
             ORDER BY timestamp ASC
             LIMIT 1;
             """
         elif file_type == ".TLOG":
-            query = f"""
+            return f"""
             SELECT loguid, timestamp
             FROM {self.database}
-            WHERE loguid = '{loguid}'
+            WHERE loguid = ?
             AND (MessageType = 'HEARTBEAT')
             AND (KeyName = 'type')
             ORDER BY timestamp ASC
             LIMIT 1;
             """
-        else:
-            return None
+        return None
 
-        query_execution_id = self.execute_query(query)
-        if not query_execution_id:
+    def _query_boot_time(self, loguid: str,
+                         file_type: str) -> Optional[str]:
+        """Look up the boot time of a loguid, without the lookup cache."""
+        query = self.get_boot_time_query(file_type)
+        if not query:
             return None
-        query_completed = self.wait_for_query_to_complete(query_execution_id)
-        if query_completed:
-            results = self.get_query_results(query_execution_id)
-            if results and 'ResultSet' in results and (
-                    'Rows' in results['ResultSet']):
-                first_row = results['ResultSet']['Rows'][1]
-                value = first_row['Data'][1]['VarCharValue']
-                return value
-        return None
+        # Only the header row and the first data row are needed.
+        _, results = self.run_query(
+            query, max_results=2, execution_parameters=[sql_string(loguid)])
+        return _first_row_value(results, 1)
 
     def get_add_partition_query(self, partition_list: list,
                                 s3_bucket_name: str) -> str:
@@ -166,66 +807,135 @@ class AthenaHandler:
         :param s3_bucket_name: The name of the S3 bucket.
         :return: The ALTER TABLE query.
         """
-        partitions = []
-        # create the ALTER TABLE query
-        query = f"ALTER TABLE {self.database} ADD\n"
+        partitions = [
+            _PARTITION_CLAUSE.format(*values, s3_bucket_name, folder)
+            for folder, values in _parse_partition_folders(partition_list)]
+        if not partitions:
+            return None
+        return (f"ALTER TABLE {self.database} ADD\n" +
+                "\n".join(partitions) + ";")
 
-        for folder in partition_list:
-            try:
-                # Normalize folder path to use forward slashes
-                folder = folder.replace("\\", "/").lstrip("/").rstrip("\n")
-                parts = folder.split("/")
-                loguid = parts[0].split("=")[1]
-                messagetype = parts[1].split("=")[1]
-                instance = parts[2].split("=")[1]
-                keyname = parts[3].split("=")[1]
-                # Construct the PARTITION clause
-                partition = (f"PARTITION (loguid='{loguid}', "
-                             f"messagetype='{messagetype}', "
-                             f"instance='{instance}', keyname='{keyname}')\n"
-                             f"LOCATION 's3://{s3_bucket_name}/{folder}'")
-                partitions.append(partition)
-            except IndexError:
-                logger.error(f"Error parsing folder path: {folder}")
-                continue
+    def add_partitions_glue(self, partition_list: list,
+                            s3_bucket_name: str,
+                            max_workers: int = 10) -> Optional[bool]:
+        """
+        Add partitions to the table directly in the Glue catalog.
 
-        if not partitions:
+        BatchCreatePartition calls of up to GLUE_PARTITIONS_PER_CALL
+        partitions are made concurrently. This does not go through Athena,
+        so no DDL query is queued, billed or written to S3. The partitions
+        use the table's storage descriptor with their own location, as
+        ALTER TABLE ADD PARTITION does. Partitions that already exist are
+        left as they are.
+
+        :param partition_list: A list of partition values.
+        :param s3_bucket_name: The name of the S3 bucket.
+        :param max_workers: The maximum number of concurrent calls.
+        :return: True if the partitions were added, False if not, or None if
+        the table could not be read from the Glue catalog.
+        """
+        if not self.table_name:
             return None
-        query += "\n".join(partitions) + ";"
-        return query
+        try:
+            table = self.glue_client.get_table(
+                DatabaseName=self.database_name, Name=self.table_name)['Table']
+            storage_descriptor = table['StorageDescriptor']
+            key_order = [PARTITION_KEYS.index(key['Name'].lower())
+                         for key in table['PartitionKeys']]
+        except (ClientError, KeyError, ValueError) as e:
+            logger.error("Error getting table from Glue: %s", e)
+            return None
+
+        partition_inputs = [
+            {'Values': [values[i] for i in key_order],
+             'StorageDescriptor': dict(
+                 storage_descriptor,
+                 Location=f"s3://{s3_bucket_name}/{folder}")}
+            for folder, values in _parse_partition_folders(partition_list)]
+        if not partition_inputs:
+            return False
+
+        def create(chunk):
+            try:
+                response = self.glue_client.batch_create_partition(
+                    DatabaseName=self.database_name,
+                    TableName=self.table_name,
+                    PartitionInputList=chunk)
+            except ClientError as e:
+                logger.error("Error creating partitions in Glue: %s", e)
+                return False
+            errors = [error for error in response.get('Errors', [])
+                      if error['ErrorDetail']['ErrorCode'] !=
+                      'AlreadyExistsException']
+            for error in errors:
+                logger.error("Error creating partition %s: %s",
+                             error['PartitionValues'],
+                             error['ErrorDetail'].get('ErrorMessage'))
+            return not errors
+
+        chunks = [partition_inputs[start:start + GLUE_PARTITIONS_PER_CALL]
+                  for start in range(0, len(partition_inputs),
+                                     GLUE_PARTITIONS_PER_CALL)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return all(list(executor.map(create, chunks)))
 
     def add_partitions(self, partition_list: list,
-                       s3_bucket_name: str) -> bool:
+                       s3_bucket_name: str,
+                       chunk_size: int = PARTITIONS_PER_QUERY) -> bool:
         """
         Add partitions to an Athena table.
 
+        The partitions are created through the Glue catalog when the table
+        can be read from it (see add_partitions_glue). Otherwise they are
+        split into chunks of chunk_size, and one ALTER TABLE statement per
+        chunk is run concurrently, which keeps each statement well under
+        Athena's query length limit. Results of queries run before the
+        partitions were added are no longer reused.
+
         :param partition_list: A list of partition values.
         :param s3_bucket_name: The name of the S3 bucket.
+        :param chunk_size: The maximum number of partitions per statement.
+
         :return: True if the partitions were added or False.
         """
-        query = self.get_add_partition_query(partition_list, s3_bucket_name)
-        if not query:
-            return False
-        query_execution_id = self.execute_query(query)
-        if not query_execution_id:
+        added = self.add_partitions_glue(partition_list, s3_bucket_name)
+        if added is None:
+            added = self._add_partitions_ddl(partition_list, s3_bucket_name,
+                                             chunk_size)
+        self._partitions_added_at = time.monotonic()
+        self._result_cache.clear()
+        return added
+
+    def _add_partitions_ddl(self, partition_list: list, s3_bucket_name: str,
+                            chunk_size: int) -> bool:
+        """Add partitions with ALTER TABLE queries, see add_partitions."""
+
+        queries = []
+        for start in range(0, len(partition_list), chunk_size):
+            query = self.get_add_partition_query(
+                partition_list[start:start + chunk_size], s3_bucket_name)
+            if query:
+                queries.append(query)
+        if not queries:
             return False
-        query_completed = self.wait_for_query_to_complete(query_execution_id)
-        return query_completed
+        query_execution_ids = self.execute_queries(queries,
+                                                   reuse_results=False)
+        return all(query_execution_ids)
 
-    def get_fc_firmware_query(self, loguid: str) -> str:
+    def get_fc_firmware_query(self, loguid: str) -> Tuple[str, List[str]]:
         """
         Generate SQL query to retrieve firmware information from telemetry.
 
         :param loguid: SHA256 hash for the log entry
-        :return: SQL query string
+        :return: SQL query string and its execution parameters
         """
-        return f"""
+        query = """
         WITH RankedLogs AS (
             SELECT 
                 loguid, messagetype, instance, keyname, stringvalue,
                 ROW_NUMBER() OVER (PARTITION BY loguid ORDER BY loguid) AS rn
             FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
+            WHERE loguid = {loguid}
               AND (
                 (messagetype = 'MSG' AND instance = '0' AND keyname = 'Message' 
                  AND (LOWER(stringvalue) LIKE '%ardupilot%' OR LOWER(stringvalue) LIKE '%carbopilot%' OR LOWER(stringvalue) LIKE '%cxpilot%'))
@@ -239,6 +949,7 @@ class AthenaHandler:
         WHERE rn = 1
         ORDER BY loguid;
         """
+        return _bind_parameters(query, loguid=loguid)
 
     def get_fc_firmware(self, loguid: str) -> Optional[str]:
         """
@@ -247,386 +958,554 @@ class AthenaHandler:
         :param loguid: The loguid to get firmware information for.
         :return: The firmware information or None if an error occurs.
         """
-        query = self.get_fc_firmware_query(loguid)
-        query_execution_id = self.execute_query(query)
-        if not query_execution_id:
-            return None
-        query_completed = self.wait_for_query_to_complete(query_execution_id)
-        if query_completed:
-            results = self.get_query_results(query_execution_id)
-            if (results and 'ResultSet' in results and 'Rows' in
-                    results['ResultSet']):
-                rows = results['ResultSet']['Rows']
-                if (len(rows) > 1 and 'Data' in rows[1] and
-                        len(rows[1]['Data']) > 4):
-                    return rows[1]['Data'][4]['VarCharValue']
-        return None
+        query, params = self.get_fc_firmware_query(loguid)
+        _, results = self.run_query(query, max_results=2,
+                                    execution_parameters=params)
+        return _first_row_value(results, 4)
 
     def get_unique_instance_query(self, loguid: str,
-                                  message_type: str) -> str:
+                                  message_type: str,
+                                  limit: Optional[int] = None
+                                  ) -> Tuple[str, List[str]]:
         """
         Generate SQL query to retrieve the number of unique instances
         for a specified message type.
 
         :param loguid: SHA256 hash for the log entry
         :param message_type: The type of message to filter by
-        :return: SQL query string
+        :param limit: The maximum number of instances to return
+        :return: SQL query string and its execution parameters
         """
-        return f"""
-        SELECT DISTINCT instance AS instances
+        query = """
+        SELECT instance AS instances
+        FROM
+            telemetry_pool_v5.carbonix_logs_telemetry_data_pool
+        WHERE 
+            loguid = {loguid}
+            AND messagetype = {message_type}
+        GROUP BY instance
+        ORDER BY instances
+        """
+        if limit is not None:
+            query += f"        LIMIT {int(limit)}\n"
+        return _bind_parameters(query + ";", loguid=loguid,
+                                message_type=message_type)
+
+    def get_unique_instance_count_query(self, loguid: str,
+                                        message_type: str,
+                                        approx: bool = True
+                                        ) -> Tuple[str, List[str]]:
+        """
+        Generate SQL query to count the unique instances for a specified
+        message type.
+
+        :param loguid: SHA256 hash for the log entry
+        :param message_type: The type of message to filter by
+        :param approx: Use approx_distinct instead of an exact count
+        :return: SQL query string and its execution parameters
+        """
+        count = ("approx_distinct(instance)" if approx
+                 else "COUNT(DISTINCT instance)")
+        query = f"""
+        SELECT {count} AS instance_count
         FROM
             telemetry_pool_v5.carbonix_logs_telemetry_data_pool
         WHERE 
-            loguid = '{loguid}'
-            AND messagetype = '{message_type}'
-        ORDER BY instances;
+            loguid = {{loguid}}
+            AND messagetype = {{message_type}};
+        """
+        return _bind_parameters(query, loguid=loguid,
+                                message_type=message_type)
+
+    def count_unique_instances(self, loguid: str, message_type: str,
+                               approx: bool = True) -> Optional[int]:
+        """
+        Count the unique instances for a specified message type.
+
+        This is cheaper than get_unique_instance when only the number is
+        needed, as no instance values are returned. approx_distinct has a
+        standard error of about 2%, which is exact in practice for the few
+        instances a message type has; pass approx=False for an exact count.
+
+        :param loguid: The loguid to count unique instances for.
+        :param message_type: The type of message to filter by.
+        :param approx: Use approx_distinct instead of an exact count.
+        :return: The number of unique instances or None if an error occurs.
         """
+        query, params = self.get_unique_instance_count_query(
+            loguid, message_type, approx)
+        _, results = self.run_query(query, max_results=2,
+                                    execution_parameters=params)
+        count = _first_row_value(results, 0)
+        return int(count) if count is not None else None
 
     def get_unique_instance(self, loguid: str,
-                            message_type: str) -> Optional[list]:
+                            message_type: str,
+                            limit: Optional[int] = None) -> Optional[list]:
         """
         Retrieve the number of unique instances for a specified message type.
 
         :param loguid: The loguid to get unique instances for.
         :param message_type: The type of message to filter by.
+        :param limit: The maximum number of instances to return, lowest
+        first. All instances are returned when not set.
         :return: The number of unique instances or None if an error occurs.
         """
-        query = self.get_unique_instance_query(loguid, message_type)
-        query_execution_id = self.execute_query(query)
-        if not query_execution_id:
+        query, params = self.get_unique_instance_query(loguid, message_type,
+                                                       limit)
+        query_execution_id = self.execute_query(
+            query, execution_parameters=params)
+        if not (query_execution_id and
+                self.wait_for_query_to_complete(query_execution_id)):
             return None
-        query_completed = self.wait_for_query_to_complete(query_execution_id)
-        if query_completed:
-            results = self.get_query_results(query_execution_id)
-            if (results and 'ResultSet' in results and 'Rows'
-                    in results['ResultSet']):
-                rows = results['ResultSet']['Rows']
-                instances = []
-                for row in rows[1:]:
-                    if 'Data' in row and len(row['Data']) > 0:
-                        instances.append(row['Data'][0]['VarCharValue'])
-                return instances
-        return None
+        instances = []
+        # Skip the header row
+        for row in itertools.islice(
+                self.iter_query_results(query_execution_id), 1, None):
+            values = _row_values(row)
+            if values:
+                instances.append(values[0])
+        return instances
 
-    def get_binlog_flight_query(self, loguid, start_time):
-        return f"""
-        WITH Takeoff AS (
-            SELECT loguid, 
-                timestamp AS takeoff_timestamp, 
-                from_unixtime(cast(timestamp/1000 AS bigint)) AS takeoff_timestamp_str,
-                value AS base_mode_value
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'STAT'
-            AND instance = '0' -- String comparison
-            AND keyname = 'Armed'
-            AND value = 1
-            AND timestamp >= cast('{start_time}' AS bigint)
-            AND EXISTS (
-                SELECT 1
-                FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool AS sub
-                WHERE sub.loguid = '{loguid}'
-                    AND sub.messagetype = 'STAT'
-                    AND sub.instance = '0'
-                    AND sub.keyname = 'isFlying'
-                    AND sub.value = 1
-                    AND sub.timestamp = telemetry_pool_v5.carbonix_logs_telemetry_data_pool.timestamp
-            )
-            ORDER BY timestamp ASC
-            LIMIT 1
-        ),
-        Landing AS (
-            SELECT loguid, 
-                timestamp AS landing_timestamp, 
-                from_unixtime(cast(timestamp/1000 AS bigint)) AS landing_timestamp_str,
-                value AS base_mode_value
+    def get_binlog_flight_query(self, loguid: str, start_time: str
+                                ) -> Tuple[str, List[str]]:
+        """
+        Generate SQL query to retrieve the takeoff, landing and crew details
+        of the first flight after start_time.
+
+        The loguid is scanned once; takeoff and landing are found with window
+        functions over that scan and the nearest position samples with
+        MIN_BY.
+
+        :param loguid: SHA256 hash for the log entry
+        :param start_time: The timestamp to look for a takeoff from
+        :return: SQL query string and its execution parameters
+        """
+        query = """
+        -- Read every row the query needs in a single scan of the loguid.
+        WITH Telemetry AS (
+            SELECT timestamp, messagetype, keyname, value, stringvalue
             FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'STAT'
+            WHERE loguid = {loguid}
+            AND messagetype IN ('STAT', 'GPS', 'MSG')
             AND instance = '0' -- String comparison
-            AND keyname = 'Armed'
-            AND value = 0
-            AND timestamp > (SELECT takeoff_timestamp FROM Takeoff)
-            AND EXISTS (
-                SELECT 1
-                FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool AS sub
-                WHERE sub.loguid = '{loguid}'
-                    AND sub.messagetype = 'STAT'
-                    AND sub.instance = '0'
-                    AND sub.keyname = 'isFlying'
-                    AND sub.value = 0
-                    AND sub.timestamp = telemetry_pool_v5.carbonix_logs_telemetry_data_pool.timestamp
+            AND (
+                (messagetype = 'STAT' AND keyname IN ('Armed', 'isFlying'))
+                OR (messagetype = 'GPS' AND keyname IN ('Lat', 'Lng'))
+                OR (messagetype = 'MSG' AND keyname = 'Message'
+                    AND (stringvalue LIKE '%PIC:%' OR stringvalue LIKE '%GSO:%'))
             )
-            ORDER BY timestamp ASC
-            LIMIT 1
-        ),
-        TakeoffLat AS (
-            SELECT loguid, 
-                timestamp AS takeoff_timestamp, 
-                value AS takeoff_lat
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'GPS'
-            AND instance = '0'
-            AND keyname = 'Lat'
-            ORDER BY ABS(timestamp - (SELECT takeoff_timestamp FROM Takeoff)) ASC
-            LIMIT 1
-        ),
-        TakeoffLong AS (
-            SELECT loguid, 
-                timestamp AS takeoff_timestamp, 
-                value AS takeoff_long
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'GPS'
-            AND instance = '0'
-            AND keyname = 'Lng'
-            ORDER BY ABS(timestamp - (SELECT takeoff_timestamp FROM Takeoff)) ASC
-            LIMIT 1
         ),
-        LandingLat AS (
-            SELECT loguid, 
-                timestamp AS landing_timestamp, 
-                value AS landing_lat
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'GPS'
-            AND instance = '0'
-            AND keyname = 'Lat'
-            ORDER BY ABS(timestamp - (SELECT landing_timestamp FROM Landing)) ASC
-            LIMIT 1
+        -- Takeoff is a STAT timestamp that is both Armed and isFlying, and
+        -- landing one that is neither.
+        Flags AS (
+            SELECT *,
+                messagetype = 'STAT'
+                AND bool_or(keyname = 'Armed' AND value = 1) OVER (
+                    PARTITION BY messagetype, timestamp)
+                AND bool_or(keyname = 'isFlying' AND value = 1) OVER (
+                    PARTITION BY messagetype, timestamp) AS is_takeoff,
+                messagetype = 'STAT'
+                AND bool_or(keyname = 'Armed' AND value = 0) OVER (
+                    PARTITION BY messagetype, timestamp)
+                AND bool_or(keyname = 'isFlying' AND value = 0) OVER (
+                    PARTITION BY messagetype, timestamp) AS is_landing
+            FROM Telemetry
         ),
-        LandingLong AS (
-            SELECT loguid, 
-                timestamp AS landing_timestamp, 
-                value AS landing_long
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'GPS'
-            AND instance = '0'
-            AND keyname = 'Lng'
-            ORDER BY ABS(timestamp - (SELECT landing_timestamp FROM Landing)) ASC
-            LIMIT 1
+        Takeoff AS (
+            SELECT *,
+                MIN(CASE WHEN is_takeoff
+                         AND timestamp >= cast({start_time} AS bigint)
+                    THEN timestamp END) OVER () AS takeoff_timestamp
+            FROM Flags
         ),
-        PilotGSO AS (
-            SELECT loguid, 
-                timestamp, 
-                stringvalue AS message
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'MSG'
-            AND instance = '0' -- String comparison
-            AND keyname = 'Message'
-            AND timestamp >= cast('{start_time}' AS bigint)
-            AND timestamp <= (SELECT landing_timestamp FROM Landing)
-            AND (stringvalue LIKE '%PIC:%' OR stringvalue LIKE '%GSO:%')
-            ORDER BY timestamp ASC
-            LIMIT 2
+        Landing AS (
+            SELECT *,
+                MIN(CASE WHEN is_landing AND timestamp > takeoff_timestamp
+                    THEN timestamp END) OVER () AS landing_timestamp
+            FROM Takeoff
         )
+        -- MIN_BY picks the position sample nearest to takeoff and landing
+        -- in the same pass, without sorting the samples.
         SELECT 
-            t.takeoff_timestamp,
-            t.takeoff_timestamp_str,
-            tl.takeoff_lat,
-            tlon.takeoff_long,
-            pg.message AS pilot,
-            pg2.message AS gso,
-            l.landing_timestamp,
-            l.landing_timestamp_str,
-            ll.landing_lat,
-            llon.landing_long,
-            (l.landing_timestamp - t.takeoff_timestamp) / 1000 AS total_flight_time
-        FROM Takeoff t
-        JOIN Landing l ON t.loguid = l.loguid
-        JOIN TakeoffLat tl ON t.loguid = tl.loguid
-        JOIN TakeoffLong tlon ON t.loguid = tlon.loguid
-        JOIN LandingLat ll ON l.loguid = ll.loguid
-        JOIN LandingLong llon ON l.loguid = llon.loguid
-        LEFT JOIN PilotGSO pg ON t.loguid = pg.loguid AND pg.message LIKE '%PIC:%'
-        LEFT JOIN PilotGSO pg2 ON t.loguid = pg2.loguid AND pg2.message LIKE '%GSO:%';
-        """
-
-    def tlog_flight_data_query(self, loguid, start_time):
-        return f"""
-        WITH Takeoff AS (
-            SELECT loguid, 
-                timestamp AS takeoff_timestamp, 
-                from_unixtime(cast(timestamp/1000 AS bigint)) AS takeoff_timestamp_str,
-                value AS base_mode_value
+            takeoff_timestamp,
+            from_unixtime(cast(takeoff_timestamp/1000 AS bigint)) AS takeoff_timestamp_str,
+            MIN_BY(value, ABS(timestamp - takeoff_timestamp)) FILTER (
+                WHERE messagetype = 'GPS' AND keyname = 'Lat') AS takeoff_lat,
+            MIN_BY(value, ABS(timestamp - takeoff_timestamp)) FILTER (
+                WHERE messagetype = 'GPS' AND keyname = 'Lng') AS takeoff_long,
+            MIN_BY(stringvalue, timestamp) FILTER (
+                WHERE messagetype = 'MSG' AND stringvalue LIKE '%PIC:%'
+                AND timestamp >= cast({start_time} AS bigint)
+                AND timestamp <= landing_timestamp) AS pilot,
+            MIN_BY(stringvalue, timestamp) FILTER (
+                WHERE messagetype = 'MSG' AND stringvalue LIKE '%GSO:%'
+                AND timestamp >= cast({start_time} AS bigint)
+                AND timestamp <= landing_timestamp) AS gso,
+            landing_timestamp,
+            from_unixtime(cast(landing_timestamp/1000 AS bigint)) AS landing_timestamp_str,
+            MIN_BY(value, ABS(timestamp - landing_timestamp)) FILTER (
+                WHERE messagetype = 'GPS' AND keyname = 'Lat') AS landing_lat,
+            MIN_BY(value, ABS(timestamp - landing_timestamp)) FILTER (
+                WHERE messagetype = 'GPS' AND keyname = 'Lng') AS landing_long,
+            (landing_timestamp - takeoff_timestamp) / 1000 AS total_flight_time
+        FROM Landing
+        WHERE takeoff_timestamp IS NOT NULL
+        AND landing_timestamp IS NOT NULL
+        GROUP BY takeoff_timestamp, landing_timestamp;
+        """
+        return _bind_parameters(query, loguid=loguid,
+                                start_time=start_time)
+
+    def tlog_flight_data_query(self, loguid: str, start_time: str
+                               ) -> Tuple[str, List[str]]:
+        """
+        Generate SQL query to retrieve the takeoff, landing and crew details
+        of the first flight after start_time.
+
+        The loguid is scanned once; takeoff and landing are found with window
+        functions over that scan and the nearest position samples with
+        MIN_BY.
+
+        :param loguid: SHA256 hash for the log entry
+        :param start_time: The timestamp to look for a takeoff from
+        :return: SQL query string and its execution parameters
+        """
+        query = """
+        -- Read every row the query needs in a single scan of the loguid.
+        WITH Telemetry AS (
+            SELECT timestamp, messagetype, keyname, value, stringvalue
             FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'HEARTBEAT'
-            AND instance = '1'
-            AND keyname = 'base_mode'
-            AND value >= 128
-            AND timestamp >= cast('{start_time}' AS bigint)
-            AND EXISTS (
-                SELECT 1
-                FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool AS sub
-                WHERE sub.loguid = '{loguid}'
-                    AND sub.messagetype = 'VFR_HUD'
-                    AND sub.instance = '1'
-                    AND sub.keyname = 'throttle'
-                    AND sub.value >= 5
-                    AND ABS(sub.timestamp - telemetry_pool_v5.carbonix_logs_telemetry_data_pool.timestamp) <= 1000
-            )
-            AND EXISTS (
-                SELECT 1
-                FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool AS sub
-                WHERE sub.loguid = '{loguid}'
-                    AND sub.messagetype = 'VFR_HUD'
-                    AND sub.instance = '1'
-                    AND sub.keyname = 'groundspeed'
-                    AND sub.value >= 3
-                    AND ABS(sub.timestamp - telemetry_pool_v5.carbonix_logs_telemetry_data_pool.timestamp) <= 1000
+            WHERE loguid = {loguid}
+            AND messagetype IN ('HEARTBEAT', 'VFR_HUD', 'GLOBAL_POSITION_INT',
+                                'STATUSTEXT')
+            AND (
+                (messagetype = 'HEARTBEAT' AND instance = '1'
+                    AND keyname = 'base_mode')
+                OR (messagetype = 'VFR_HUD' AND instance = '1'
+                    AND keyname IN ('throttle', 'groundspeed'))
+                OR (messagetype = 'GLOBAL_POSITION_INT' AND instance = '1'
+                    AND keyname IN ('lat', 'lon'))
+                OR (messagetype = 'STATUSTEXT' AND keyname = 'text'
+                    AND (stringvalue LIKE '%PIC:%' OR stringvalue LIKE '%GSO:%'))
             )
-            ORDER BY timestamp ASC
-            LIMIT 1
-        ),
-        Landing AS (
-            SELECT loguid, 
-                timestamp AS landing_timestamp, 
-                from_unixtime(cast(timestamp/1000 AS bigint)) AS landing_timestamp_str,
-                value AS base_mode_value
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'HEARTBEAT'
-            AND instance = '1'
-            AND keyname = 'base_mode'
-            AND value < 128
-            AND timestamp > (SELECT takeoff_timestamp FROM Takeoff)
-            ORDER BY timestamp ASC
-            LIMIT 1
-        ),
-        TakeoffLat AS (
-            SELECT loguid, 
-                timestamp AS takeoff_timestamp, 
-                value AS takeoff_lat
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'GLOBAL_POSITION_INT'
-            AND instance = '1'
-            AND keyname = 'lat'
-            ORDER BY ABS(timestamp - (SELECT takeoff_timestamp FROM Takeoff)) ASC
-            LIMIT 1
-        ),
-        TakeoffLong AS (
-            SELECT loguid, 
-                timestamp AS takeoff_timestamp, 
-                value AS takeoff_long
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'GLOBAL_POSITION_INT'
-            AND instance = '1'
-            AND keyname = 'lon'
-            ORDER BY ABS(timestamp - (SELECT takeoff_timestamp FROM Takeoff)) ASC
-            LIMIT 1
         ),
-        LandingLat AS (
-            SELECT loguid, 
-                timestamp AS landing_timestamp, 
-                value AS landing_lat
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'GLOBAL_POSITION_INT'
-            AND instance = '1'
-            AND keyname = 'lat'
-            ORDER BY ABS(timestamp - (SELECT landing_timestamp FROM Landing)) ASC
-            LIMIT 1
+        -- Takeoff is an armed HEARTBEAT with throttle and groundspeed up
+        -- within a second of it, and landing a disarmed HEARTBEAT.
+        Flags AS (
+            SELECT *,
+                messagetype = 'HEARTBEAT' AND value >= 128
+                AND bool_or(messagetype = 'VFR_HUD' AND keyname = 'throttle'
+                            AND value >= 5) OVER (
+                    ORDER BY timestamp
+                    RANGE BETWEEN 1000 PRECEDING AND 1000 FOLLOWING)
+                AND bool_or(messagetype = 'VFR_HUD' AND keyname = 'groundspeed'
+                            AND value >= 3) OVER (
+                    ORDER BY timestamp
+                    RANGE BETWEEN 1000 PRECEDING AND 1000 FOLLOWING) AS is_takeoff,
+                messagetype = 'HEARTBEAT' AND value < 128 AS is_landing
+            FROM Telemetry
         ),
-        LandingLong AS (
-            SELECT loguid, 
-                timestamp AS landing_timestamp, 
-                value AS landing_long
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'GLOBAL_POSITION_INT'
-            AND instance = '1'
-            AND keyname = 'lon'
-            ORDER BY ABS(timestamp - (SELECT landing_timestamp FROM Landing)) ASC
-            LIMIT 1
+        Takeoff AS (
+            SELECT *,
+                MIN(CASE WHEN is_takeoff
+                         AND timestamp >= cast({start_time} AS bigint)
+                    THEN timestamp END) OVER () AS takeoff_timestamp
+            FROM Flags
         ),
-        PilotGSO AS (
-            SELECT loguid, 
-                timestamp, 
-                stringvalue AS message
-            FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
-            WHERE loguid = '{loguid}'
-            AND messagetype = 'STATUSTEXT'
-            AND keyname = 'text'
-            AND timestamp >= cast('{start_time}' AS bigint)
-            AND timestamp <= (SELECT landing_timestamp FROM Landing)
-            AND (stringvalue LIKE '%PIC:%' OR stringvalue LIKE '%GSO:%')
-            ORDER BY timestamp ASC
-            LIMIT 2
+        Landing AS (
+            SELECT *,
+                MIN(CASE WHEN is_landing AND timestamp > takeoff_timestamp
+                    THEN timestamp END) OVER () AS landing_timestamp
+            FROM Takeoff
         )
+        -- MIN_BY picks the position sample nearest to takeoff and landing
+        -- in the same pass, without sorting the samples.
         SELECT 
-            t.takeoff_timestamp,
-            t.takeoff_timestamp_str,
-            tl.takeoff_lat,
-            tlon.takeoff_long,
-            pg.message AS pilot,
-            pg2.message AS gso,
-            l.landing_timestamp,
-            l.landing_timestamp_str,
-            ll.landing_lat,
-            llon.landing_long,
-            (l.landing_timestamp - t.takeoff_timestamp) / 1000 AS total_flight_time
-        FROM Takeoff t
-        JOIN Landing l ON t.loguid = l.loguid
-        JOIN TakeoffLat tl ON t.loguid = tl.loguid
-        JOIN TakeoffLong tlon ON t.loguid = tlon.loguid
-        JOIN LandingLat ll ON l.loguid = ll.loguid
-        JOIN LandingLong llon ON l.loguid = llon.loguid
-        LEFT JOIN PilotGSO pg ON t.loguid = pg.loguid AND pg.message LIKE '%PIC:%'
-        LEFT JOIN PilotGSO pg2 ON t.loguid = pg2.loguid AND pg2.message LIKE '%GSO:%';
+            takeoff_timestamp,
+            from_unixtime(cast(takeoff_timestamp/1000 AS bigint)) AS takeoff_timestamp_str,
+            MIN_BY(value, ABS(timestamp - takeoff_timestamp)) FILTER (
+                WHERE messagetype = 'GLOBAL_POSITION_INT' AND keyname = 'lat') AS takeoff_lat,
+            MIN_BY(value, ABS(timestamp - takeoff_timestamp)) FILTER (
+                WHERE messagetype = 'GLOBAL_POSITION_INT' AND keyname = 'lon') AS takeoff_long,
+            MIN_BY(stringvalue, timestamp) FILTER (
+                WHERE messagetype = 'STATUSTEXT' AND stringvalue LIKE '%PIC:%'
+                AND timestamp >= cast({start_time} AS bigint)
+                AND timestamp <= landing_timestamp) AS pilot,
+            MIN_BY(stringvalue, timestamp) FILTER (
+                WHERE messagetype = 'STATUSTEXT' AND stringvalue LIKE '%GSO:%'
+                AND timestamp >= cast({start_time} AS bigint)
+                AND timestamp <= landing_timestamp) AS gso,
+            landing_timestamp,
+            from_unixtime(cast(landing_timestamp/1000 AS bigint)) AS landing_timestamp_str,
+            MIN_BY(value, ABS(timestamp - landing_timestamp)) FILTER (
+                WHERE messagetype = 'GLOBAL_POSITION_INT' AND keyname = 'lat') AS landing_lat,
+            MIN_BY(value, ABS(timestamp - landing_timestamp)) FILTER (
+                WHERE messagetype = 'GLOBAL_POSITION_INT' AND keyname = 'lon') AS landing_long,
+            (landing_timestamp - takeoff_timestamp) / 1000 AS total_flight_time
+        FROM Landing
+        WHERE takeoff_timestamp IS NOT NULL
+        AND landing_timestamp IS NOT NULL
+        GROUP BY takeoff_timestamp, landing_timestamp;
+        """
+        return _bind_parameters(query, loguid=loguid,
+                                start_time=start_time)
+
+    def get_flight_data_query(self, loguid: str, start_time: str,
+                              file_type: str
+                              ) -> Optional[Tuple[str, List[str]]]:
+        """
+        Generate the flight data SQL query for a log type.
+
+        :param loguid: SHA256 hash for the log entry
+        :param start_time: The timestamp to look for a takeoff from
+        :param file_type: The type of file to get data for.
+        :return: SQL query string and its execution parameters, or None for
+        an unknown log type
+        """
+        if file_type.lower() in (".bin", "bin"):
+            return self.get_binlog_flight_query(loguid, start_time)
+        if file_type.lower() in (".tlog", "tlog"):
+            return self.tlog_flight_data_query(loguid, start_time)
+        return None
+
+    def get_flight_events_query(self, loguid: str, start_time: str,
+                                file_type: str
+                                ) -> Optional[Tuple[str, List[str]]]:
+        """
+        Generate SQL query to retrieve the takeoff and landing timestamps of
+        the first flight after start_time.
+
+        Only the messages that mark takeoff and landing are read.
+
+        :param loguid: SHA256 hash for the log entry
+        :param start_time: The timestamp to look for a takeoff from
+        :param file_type: The type of file to get data for.
+        :return: SQL query string and its execution parameters, or None for
+        an unknown log type
+        """
+        if file_type.lower() in (".bin", "bin"):
+            query = """
+            WITH Flags AS (
+                SELECT timestamp,
+                    bool_or(keyname = 'Armed' AND value = 1) OVER (
+                        PARTITION BY timestamp)
+                    AND bool_or(keyname = 'isFlying' AND value = 1) OVER (
+                        PARTITION BY timestamp) AS is_takeoff,
+                    bool_or(keyname = 'Armed' AND value = 0) OVER (
+                        PARTITION BY timestamp)
+                    AND bool_or(keyname = 'isFlying' AND value = 0) OVER (
+                        PARTITION BY timestamp) AS is_landing
+                FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
+                WHERE loguid = {loguid}
+                AND messagetype = 'STAT'
+                AND instance = '0' -- String comparison
+                AND keyname IN ('Armed', 'isFlying')
+            ),"""
+        elif file_type.lower() in (".tlog", "tlog"):
+            query = """
+            WITH Flags AS (
+                SELECT timestamp,
+                    messagetype = 'HEARTBEAT' AND value >= 128
+                    AND bool_or(keyname = 'throttle' AND value >= 5) OVER (
+                        ORDER BY timestamp
+                        RANGE BETWEEN 1000 PRECEDING AND 1000 FOLLOWING)
+                    AND bool_or(keyname = 'groundspeed' AND value >= 3) OVER (
+                        ORDER BY timestamp
+                        RANGE BETWEEN 1000 PRECEDING AND 1000 FOLLOWING)
+                    AS is_takeoff,
+                    messagetype = 'HEARTBEAT' AND value < 128 AS is_landing
+                FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
+                WHERE loguid = {loguid}
+                AND messagetype IN ('HEARTBEAT', 'VFR_HUD')
+                AND instance = '1'
+                AND keyname IN ('base_mode', 'throttle', 'groundspeed')
+            ),"""
+        else:
+            return None
+        query += """
+            Takeoff AS (
+                SELECT *,
+                    MIN(CASE WHEN is_takeoff
+                             AND timestamp >= cast({start_time} AS bigint)
+                        THEN timestamp END) OVER () AS takeoff_timestamp
+                FROM Flags
+            ),
+            Landing AS (
+                SELECT *,
+                    MIN(CASE WHEN is_landing AND timestamp > takeoff_timestamp
+                        THEN timestamp END) OVER () AS landing_timestamp
+                FROM Takeoff
+            )
+            SELECT DISTINCT
+                takeoff_timestamp,
+                from_unixtime(cast(takeoff_timestamp/1000 AS bigint)) AS takeoff_timestamp_str,
+                landing_timestamp,
+                from_unixtime(cast(landing_timestamp/1000 AS bigint)) AS landing_timestamp_str
+            FROM Landing
+            WHERE takeoff_timestamp IS NOT NULL
+            AND landing_timestamp IS NOT NULL;
+            """
+        return _bind_parameters(query, loguid=loguid, start_time=start_time)
+
+    def get_flight_position_query(self, loguid: str, takeoff_timestamp: str,
+                                  landing_timestamp: str, file_type: str
+                                  ) -> Optional[Tuple[str, List[str]]]:
+        """
+        Generate SQL query to retrieve the position samples nearest to
+        takeoff and landing.
+
+        :param loguid: SHA256 hash for the log entry
+        :param takeoff_timestamp: The takeoff timestamp
+        :param landing_timestamp: The landing timestamp
+        :param file_type: The type of file to get data for.
+        :return: SQL query string and its execution parameters, or None for
+        an unknown log type
+        """
+        sources = FLIGHT_MESSAGE_SOURCES.get(file_type.lower().lstrip('.'))
+        if not sources:
+            return None
+        message_type, instance, (lat, lng) = sources['position']
+        query = """
+        SELECT
+            MIN_BY(value, ABS(timestamp - {takeoff})) FILTER (
+                WHERE keyname = {lat}) AS takeoff_lat,
+            MIN_BY(value, ABS(timestamp - {takeoff})) FILTER (
+                WHERE keyname = {lng}) AS takeoff_long,
+            MIN_BY(value, ABS(timestamp - {landing})) FILTER (
+                WHERE keyname = {lat}) AS landing_lat,
+            MIN_BY(value, ABS(timestamp - {landing})) FILTER (
+                WHERE keyname = {lng}) AS landing_long
+        FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
+        WHERE loguid = {loguid}
+        AND messagetype = {message_type}
+        AND instance = {instance}
+        AND keyname IN ({lat}, {lng});
+        """
+        return _bind_parameters(query, loguid=loguid,
+                                takeoff=int(takeoff_timestamp),
+                                landing=int(landing_timestamp),
+                                message_type=message_type,
+                                instance=instance, lat=lat, lng=lng)
+
+    def get_flight_crew_query(self, loguid: str, start_time: str,
+                              landing_timestamp: str, file_type: str
+                              ) -> Optional[Tuple[str, List[str]]]:
+        """
+        Generate SQL query to retrieve the first pilot (PIC:) and GSO (GSO:)
+        messages between start_time and landing.
+
+        :param loguid: SHA256 hash for the log entry
+        :param start_time: The timestamp to look for messages from
+        :param landing_timestamp: The landing timestamp
+        :param file_type: The type of file to get data for.
+        :return: SQL query string and its execution parameters, or None for
+        an unknown log type
+        """
+        sources = FLIGHT_MESSAGE_SOURCES.get(file_type.lower().lstrip('.'))
+        if not sources:
+            return None
+        message_type, instance, keynames = sources['crew']
+        # The instance is only filtered on where the crew messages have one.
+        instance_filter = ("\n        AND instance = {instance}"
+                           if instance is not None else "")
+        query = """
+        SELECT
+            MIN_BY(stringvalue, timestamp) FILTER (
+                WHERE stringvalue LIKE '%PIC:%') AS pilot,
+            MIN_BY(stringvalue, timestamp) FILTER (
+                WHERE stringvalue LIKE '%GSO:%') AS gso
+        FROM telemetry_pool_v5.carbonix_logs_telemetry_data_pool
+        WHERE loguid = {loguid}
+        AND messagetype = {message_type}""" + instance_filter + """
+        AND keyname IN ({keynames})
+        AND timestamp >= cast({start_time} AS bigint)
+        AND timestamp <= {landing}
+        AND (stringvalue LIKE '%PIC:%' OR stringvalue LIKE '%GSO:%');
         """
+        return _bind_parameters(query, loguid=loguid,
+                                message_type=message_type, instance=instance,
+                                keynames=keynames, start_time=start_time,
+                                landing=int(landing_timestamp))
 
     def get_flight_data(self, loguid: str, start_time: str,
-                        file_type: str) -> Optional[Dict[str, Any]]:
+                        file_type: str, parallel: bool = False
+                        ) -> Optional[Dict[str, Any]]:
         """
         Retrieve the flight data from the telemetry data.
 
+        By default one query reads the loguid once and computes everything.
+        With parallel, the takeoff and landing are looked up first, and the
+        position and crew queries then run concurrently, each reading only
+        its own message type.
+
         :param loguid: The loguid to get flight data for.
         :param start_time: The start time of the flight.
         :param file_type: The type of file to get data for.
+        :param parallel: Split the lookup into concurrent smaller queries.
         :return: The flight data or None if an error occurs.
         """
-        if file_type.lower() in (".bin", "bin"):
-            query = self.get_binlog_flight_query(loguid, start_time)
-        elif file_type.lower() in (".tlog", "tlog"):
-            query = self.tlog_flight_data_query(loguid, start_time)
-        else:
+        if parallel:
+            return self._get_flight_data_parallel(loguid, start_time,
+                                                  file_type)
+        flight_query = self.get_flight_data_query(loguid, start_time,
+                                                  file_type)
+        if not flight_query:
             return None
+        query, params = flight_query
+        _, results = self.run_query(query, execution_parameters=params)
+        return _parse_flight_data(results)
 
-        query_execution_id = self.execute_query(query)
-        if not query_execution_id:
+    def _get_flight_data_parallel(self, loguid: str, start_time: str,
+                                  file_type: str) -> Optional[Dict[str, Any]]:
+        """Retrieve the flight data with the split, concurrent queries."""
+        events_query = self.get_flight_events_query(loguid, start_time,
+                                                    file_type)
+        if not events_query:
             return None
-        query_completed = self.wait_for_query_to_complete(query_execution_id)
-        if query_completed:
-            results = self.get_query_results(query_execution_id)
-            if (results and 'ResultSet' in results and 'Rows' in
-                    results['ResultSet']):
-                rows = results['ResultSet']['Rows']
-                if (len(rows) > 1 and 'Data' in rows[1] and
-                        len(rows[1]['Data']) > 10):
-                    return {
-                        'TakeoffTimestamp': rows[1]['Data'][0]['VarCharValue'],
-                        'TakeoffTimestampStr': rows[1]['Data'][1]['VarCharValue'],
-                        'TakeoffLat': rows[1]['Data'][2]['VarCharValue'],
-                        'TakeoffLong': rows[1]['Data'][3]['VarCharValue'],
-                        'Pilot': rows[1]['Data'][4]['VarCharValue'],
-                        'GSO': rows[1]['Data'][5]['VarCharValue'],
-                        'LandingTimestamp': rows[1]['Data'][6]['VarCharValue'],
-                        'LandingTimestampStr': rows[1]['Data'][7]['VarCharValue'],
-                        'LandingLat': rows[1]['Data'][8]['VarCharValue'],
-                        'LandingLong': rows[1]['Data'][9]['VarCharValue'],
-                        'TotalFlightTime': rows[1]['Data'][10]['VarCharValue']
-                    }
-        return None
+        query, params = events_query
+        _, results = self.run_query(query, max_results=2,
+                                    execution_parameters=params)
+        rows = _result_rows(results)
+        if len(rows) < 2 or None in rows[1][:4]:
+            return None
+        (takeoff_timestamp, takeoff_timestamp_str,
+         landing_timestamp, landing_timestamp_str) = rows[1][:4]
+
+        queries, params = zip(
+            self.get_flight_position_query(loguid, takeoff_timestamp,
+                                           landing_timestamp, file_type),
+            self.get_flight_crew_query(loguid, start_time,
+                                       landing_timestamp, file_type))
+        position_id, crew_id = self.execute_queries(
+            list(queries), execution_parameters=list(params))
+        if not position_id:
+            return None
+        position = _result_rows(self.get_query_results(position_id, 2))
+        crew = _result_rows(crew_id and self.get_query_results(crew_id, 2))
+        if len(position) < 2:
+            return None
+        takeoff_lat, takeoff_long, landing_lat, landing_long = position[1]
+        pilot, gso = crew[1] if len(crew) > 1 else (None, None)
+        return {
+            'TakeoffTimestamp': takeoff_timestamp,
+            'TakeoffTimestampStr': takeoff_timestamp_str,
+            'TakeoffLat': takeoff_lat,
+            'TakeoffLong': takeoff_long,
+            'Pilot': pilot,
+            'GSO': gso,
+            'LandingTimestamp': landing_timestamp,
+            'LandingTimestampStr': landing_timestamp_str,
+            'LandingLat': landing_lat,
+            'LandingLong': landing_long,
+            'TotalFlightTime': str((int(landing_timestamp) -
+                                    int(takeoff_timestamp)) // 1000)
+        }
 
     def get_value_stats_query(self, loguid: str, message_type: str,
                               instance: int, keynames: List[str],
-                              start_time: int, stop_time: int) -> str:
+                              start_time: int, stop_time: int
+                              ) -> Tuple[str, List[str]]:
         """
         Generate SQL query to retrieve minimum, maximum, and average values 
         for a specified loguid, messageType,
@@ -638,10 +1517,35 @@ class AthenaHandler:
         :param instance: The instance identifier to filter by
         :param start_time: Start timestamp of the range
         :param stop_time: Stop timestamp of the range
-        :return: SQL query string
+        :return: SQL query string and its execution parameters
         """
-        keyname_list = ', '.join([f"'{keyname}'" for keyname in keynames])
-        return f"""
+        return self.get_value_stats_multi_query(
+            loguid, message_type, [instance], keynames, start_time,
+            stop_time)
+
+    def get_value_stats_multi_query(self, loguid: str, message_type: str,
+                                    instances: List[int],
+                                    keynames: List[str],
+                                    start_time: int, stop_time: int
+                                    ) -> Tuple[str, List[str]]:
+        """
+        Generate SQL query to retrieve minimum, maximum, and average values
+        of multiple keynames for several instances at once.
+
+        :param loguid: The unique identifier of the log entry
+        :param message_type: The type of message to filter by
+        :param instances: The instance identifiers to filter by
+        :param keynames: List of key names to filter by
+        :param start_time: Start timestamp of the range
+        :param stop_time: Stop timestamp of the range
+        :return: SQL query string and its execution parameters
+
+        instance is a string partition column; it is compared as a string so
+        that Athena can prune partitions on it. The instances and keynames
+        are padded to a power of two count so that the query text only
+        changes when the number of either crosses one.
+        """
+        query = """
         SELECT
             loguid,
             messagetype,
@@ -653,19 +1557,28 @@ class AthenaHandler:
         FROM
             telemetry_pool_v5.carbonix_logs_telemetry_data_pool
         WHERE
-            loguid = '{loguid}'
-            AND messagetype = '{message_type}'
-            AND keyname IN ({keyname_list})
-            AND CAST(instance AS integer) = {instance}
+            loguid = {loguid}
+            AND messagetype = {message_type}
+            AND keyname IN ({keynames})
+            AND instance IN ({instances})
             AND timestamp >= {start_time}
             AND timestamp <= {stop_time}
         GROUP BY
             loguid, messagetype, keyname, instance;
         """
+        return _bind_parameters(query, loguid=loguid,
+                                message_type=message_type,
+                                keynames=_pad_to_power_of_two(
+                                    list(keynames)),
+                                instances=_pad_to_power_of_two(
+                                    [str(instance) for instance in instances]),
+                                start_time=int(start_time),
+                                stop_time=int(stop_time))
 
     def get_value_stats(self, loguid: str, message_type: str,
                         instance: int, keynames: List[str],
-                        start_time: int, stop_time: int
+                        start_time: int, stop_time: int,
+                        unload: bool = False
                         ) -> Optional[Dict[str, Dict[str, float]]]:
         """
         Execute a query to retrieve minimum, maximum, and average values
@@ -678,31 +1591,66 @@ class AthenaHandler:
         :param instance: The instance identifier to filter by
         :param start_time: Start timestamp of the range
         :param stop_time: Stop timestamp of the range
+        :param unload: Run the query as an UNLOAD, see get_value_stats_multi
         :return: Dictionary containing min, max, and avg values for each
         keyname, or None if not found
         """
-        query = self.get_value_stats_query(loguid, message_type, instance,
-                                           keynames, start_time, stop_time)
-        query_execution_id = self.execute_query(query)
-        if not query_execution_id:
+        stats = self.get_value_stats_multi(loguid, message_type, [instance],
+                                           keynames, start_time, stop_time,
+                                           unload)
+        return stats.get(str(instance)) if stats else None
+
+    def get_value_stats_multi(self, loguid: str, message_type: str,
+                              instances: List[int], keynames: List[str],
+                              start_time: int, stop_time: int,
+                              unload: bool = False
+                              ) -> Optional[Dict[str, Dict[str,
+                                                           Dict[str, float]]]]:
+        """
+        Retrieve minimum, maximum, and average values of multiple keynames
+        for several instances with a single query.
+
+        One query over all instances scans the log once and pays the Athena
+        query startup once, instead of once per instance.
+
+        By default the query is a plain SELECT, whose result Athena can
+        reuse. With unload, it is run through unload_query_results instead,
+        which reads large results faster but is never reused and costs a
+        LIST and a GET per output file.
+
+        :param loguid: The unique identifier of the log entry
+        :param message_type: The type of message to filter by
+        :param instances: The instance identifiers to filter by
+        :param keynames: List of key names to filter by
+        :param start_time: Start timestamp of the range
+        :param stop_time: Stop timestamp of the range
+        :param unload: Run the query as an UNLOAD when output_location is
+        set.
+        :return: Dictionary by instance of the get_value_stats result of
+        that instance, or None if not found. Instances without values are
+        left out.
+        """
+        if not instances:
             return None
-        query_completed = self.wait_for_query_to_complete(query_execution_id)
-        if query_completed:
-            results = self.get_query_results(query_execution_id)
-            if (results and 'ResultSet' in results and 'Rows' in
-                    results['ResultSet']):
-                rows = results['ResultSet']['Rows']
-                if len(rows) > 1:
-                    stats = {}
-                    for row in rows[1:]:
-                        keyname = row['Data'][2]['VarCharValue']
-                        stats[keyname] = {
-                            'min': float(row['Data'][4]['VarCharValue']),
-                            'max': float(row['Data'][5]['VarCharValue']),
-                            'avg': float(row['Data'][6]['VarCharValue'])
-                        }
-                    return stats
-        return None
+        query, params = self.get_value_stats_multi_query(
+            loguid, message_type, instances, keynames, start_time, stop_time)
+        unloaded = (self.unload_query_results(query, params) if unload
+                    else None)
+        if unloaded is not None:
+            return _parse_unloaded_value_stats(unloaded)
+
+        query_execution_id = self.execute_query(
+            query, execution_parameters=params)
+        if not (query_execution_id and
+                self.wait_for_query_to_complete(query_execution_id)):
+            return None
+        # The CSV result file is parsed by the C csv reader in a single
+        # GET; GetQueryResults is only used if it cannot be read.
+        rows = self.get_query_results_s3(query_execution_id)
+        if rows is None:
+            rows = map(_row_values,
+                       self.iter_query_results(query_execution_id))
+        return _parse_value_stats(rows)
 
 
 if __name__ == "__main__":
@@ -760,25 +1708,34 @@ if __name__ == "__main__":
         region_name='ap-southeast-2')
 
     if athena_handler.check_loguid_exists(loguid):
-        logger.info(f"The loguid '{loguid}' exists.")
+        logger.info("The loguid '%s' exists.", loguid)
     else:
-        logger.info(f"The loguid '{loguid}' does not exist.")
+        logger.info("The loguid '%s' does not exist.", loguid)
         exit()
-    boot_time = athena_handler.get_boot_time(loguid, ".BIN")
-    logger.info(f"Boot time for loguid '{loguid}': {boot_time}")
-
-    fc_firmware = athena_handler.get_fc_firmware(loguid)
-    logger.info(f"Firmware information for loguid "
-                f"'{loguid}': {fc_firmware}")
-
-    bat_instance = athena_handler.get_unique_instance(loguid, "BAT")
-    logger.info(f"Unique instances for loguid "
-                f"'{loguid}': {bat_instance}")
-    if bat_instance:
-        for instance in bat_instance:
-            keynames = ['Volt', 'Curr', 'VoltR']
-            start_time = flight_data.get('TakeoffTimestamp')
-            stop_time = flight_data.get('LandingTimestamp')
-            stats = athena_handler.get_value_stats(
-                loguid, "BAT", int(instance), keynames, start_time, stop_time)
-            logger.info(f"Stats for instance {instance}: {stats}")
+    # The lookups are independent, so run them concurrently; each one
+    # spends nearly all of its time waiting on Athena.
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        boot_time = executor.submit(athena_handler.get_boot_time,
+                                    loguid, ".BIN")
+        fc_firmware = executor.submit(athena_handler.get_fc_firmware, loguid)
+        bat_instance = executor.submit(athena_handler.get_unique_instance,
+                                       loguid, "BAT")
+
+        logger.info("Boot time for loguid '%s': %s",
+                    loguid, boot_time.result())
+        logger.info("Firmware information for loguid '%s': %s",
+                    loguid, fc_firmware.result())
+        bat_instance = bat_instance.result()
+        logger.info("Unique instances for loguid '%s': %s",
+                    loguid, bat_instance)
+
+    # One query covers every BAT instance.
+    keynames = ['Volt', 'Curr', 'VoltR']
+    start_time = flight_data.get('TakeoffTimestamp')
+    stop_time = flight_data.get('LandingTimestamp')
+    stats = athena_handler.get_value_stats_multi(
+        loguid, "BAT", [int(instance) for instance in bat_instance or []],
+        keynames, start_time, stop_time) or {}
+    for instance in bat_instance or []:
+        logger.info("Stats for instance %s: %s",
+                    instance, stats.get(instance))
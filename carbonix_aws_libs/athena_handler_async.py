@@ -0,0 +1,575 @@
+import asyncio
+import csv
+import gzip
+import io
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aioboto3
+from botocore.exceptions import ClientError
+
+from carbonix_aws_libs._athena import (
+    ATHENA_RETRY_WAIT_TIME, THROTTLED, THROTTLING_ERROR_CODES, _QueryWait,
+    _first_row_value, _json_lines, _parse_flight_data,
+    _parse_unloaded_value_stats, _parse_value_stats, _query_cache_key,
+    _query_text_key, _row_values, _split_s3_uri, _unload_query, sql_string)
+from carbonix_aws_libs._aws import CLIENT_CONFIG, S3_CLIENT_CONFIG
+from carbonix_aws_libs.athena_handler import AthenaHandler
+
+__all__ = ['AsyncAthenaHandler']
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAthenaHandler(AthenaHandler):
+    """
+    AthenaHandler with asyncio variants of its query methods.
+
+    The *_async methods use aioboto3 and asyncio.sleep, so many queries can
+    wait concurrently on one event loop. They need the handler to be open:
+
+        async with AsyncAthenaHandler(database=...) as handler:
+            exists = await handler.check_loguid_exists_async(loguid)
+
+    Independent lookups can then run concurrently with asyncio.gather, so
+    they take as long as the slowest one rather than the sum; see
+    get_log_summary_async.
+
+    Synchronous code can call a single coroutine method through run(). The
+    synchronous AthenaHandler methods and query builders are inherited
+    unchanged, and the *_async methods share the query building, result
+    parsing and polling schedule of their synchronous counterparts; only
+    the I/O differs.
+    """
+
+    def __init__(self, database: str, output_location: Optional[str] = None,
+                 region_name: Optional[str] = 'ap-southeast-2',
+                 result_reuse_max_age_minutes: Optional[int] = 60):
+        super().__init__(database, output_location, region_name,
+                         result_reuse_max_age_minutes)
+        self.region_name = region_name
+        self.async_athena_client = None
+        self.async_glue_client = None
+        self.async_s3_client = None
+        self._exit_stack = None
+        # Tasks of the run_query_async calls in progress, by query cache key.
+        self._inflight_async: Dict[str, asyncio.Future] = {}
+
+    async def __aenter__(self) -> 'AsyncAthenaHandler':
+        """Open the aioboto3 clients used by the *_async methods."""
+        session = aioboto3.Session()
+        self._exit_stack = AsyncExitStack()
+        self.async_athena_client = await self._exit_stack.enter_async_context(
+            session.client('athena', region_name=self.region_name,
+                           config=CLIENT_CONFIG))
+        self.async_glue_client = await self._exit_stack.enter_async_context(
+            session.client('glue', region_name=self.region_name,
+                           config=CLIENT_CONFIG))
+        self.async_s3_client = await self._exit_stack.enter_async_context(
+            session.client('s3', region_name=self.region_name,
+                           config=S3_CLIENT_CONFIG))
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the aioboto3 clients."""
+        exit_stack, self._exit_stack = self._exit_stack, None
+        self.async_athena_client = None
+        self.async_glue_client = None
+        self.async_s3_client = None
+        if exit_stack:
+            await exit_stack.aclose()
+
+    def run(self, method: Callable, *args, **kwargs) -> Any:
+        """
+        Run one of the *_async methods from synchronous code.
+
+        :param method: The coroutine method to run, e.g.
+        handler.check_loguid_exists_async.
+        :return: The result of the method.
+        """
+        async def runner():
+            async with self:
+                return await method(*args, **kwargs)
+        return asyncio.run(runner())
+
+    async def execute_query_async(self, query: str,
+                                  reuse_results: bool = True,
+                                  execution_parameters: Optional[
+                                      List[str]] = None) -> Optional[str]:
+        """
+        Execute an Athena query.
+
+        :param query: The SQL query to execute.
+        :param reuse_results: Allow Athena to return a recent cached result.
+        :param execution_parameters: Values for the ? placeholders.
+        :return: The query execution ID or None if an error occurs.
+        """
+        try:
+            params = self._start_query_execution_params(
+                query, reuse_results, execution_parameters)
+            response = await self.async_athena_client.start_query_execution(
+                **params)
+            query_execution_id = response['QueryExecutionId']
+            logger.debug("%s", query_execution_id)
+            return query_execution_id
+        except ClientError as e:
+            logger.error("%s", e)
+            return None
+
+    async def get_query_status_async(self, query_execution_id: str
+                                     ) -> Optional[str]:
+        """
+        Get the status of an Athena query.
+
+        :param query_execution_id: The ID of the query execution.
+        :return: The status of the query, THROTTLED if Athena throttled the
+        request, or None if an error occurs.
+        """
+        try:
+            response = await self.async_athena_client.get_query_execution(
+                QueryExecutionId=query_execution_id)
+            status = response['QueryExecution']['Status']['State']
+            logger.debug("Query %s status: %s", query_execution_id, status)
+            return status
+        except ClientError as e:
+            if e.response['Error']['Code'] in THROTTLING_ERROR_CODES:
+                logger.warning("Query status check throttled: %s", e)
+                return THROTTLED
+            logger.error("Error getting query status: %s", e)
+            return None
+
+    async def wait_for_query_to_complete_async(
+            self, query_execution_id: str, delay: float = 5,
+            base_delay: float = 0.1,
+            retry_wait_time: float = ATHENA_RETRY_WAIT_TIME,
+            expected_runtime: Optional[float] = None) -> bool:
+        """
+        Wait for an Athena query to complete without blocking the loop.
+
+        :param query_execution_id: The ID of the query execution.
+        :param delay: The maximum delay between status checks in seconds.
+        :param base_delay: The delay before the first re-check in seconds.
+        :param retry_wait_time: How long to keep retrying while throttled.
+        :param expected_runtime: The usual runtime of the query in seconds.
+        :return: True if the query completed successfully, False otherwise.
+        """
+        wait = _QueryWait(query_execution_id, delay, base_delay,
+                          retry_wait_time, expected_runtime)
+        sleep = wait.first_delay
+        while sleep is not None:
+            await asyncio.sleep(sleep)
+            sleep = wait.next_delay(
+                await self.get_query_status_async(query_execution_id))
+        return wait.succeeded
+
+    async def get_query_results_async(self, query_execution_id: str,
+                                      max_results: Optional[int] = None
+                                      ) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve the results of an Athena query.
+
+        :param query_execution_id: The ID of the query execution.
+        :param max_results: The maximum number of rows to return.
+        :return: The query results or None if an error occurs.
+        """
+        try:
+            params = {'QueryExecutionId': query_execution_id}
+            if max_results:
+                params['MaxResults'] = max_results
+            return await self.async_athena_client.get_query_results(**params)
+        except ClientError as e:
+            logger.error("Error getting query results: %s", e)
+            return None
+
+    async def iter_query_results_async(self, query_execution_id: str,
+                                       page_size: int = 1000
+                                       ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Iterate over all result rows of an Athena query, page by page.
+
+        :param query_execution_id: The ID of the query execution.
+        :param page_size: The number of rows requested per page.
+        :return: An async iterator over the rows, starting with the header
+        row. The iteration stops early if a page cannot be retrieved.
+        """
+        paginator = self.async_athena_client.get_paginator(
+            'get_query_results')
+        try:
+            async for page in paginator.paginate(
+                    QueryExecutionId=query_execution_id,
+                    PaginationConfig={'PageSize': page_size}):
+                for row in page['ResultSet'].get('Rows', []):
+                    yield row
+        except ClientError as e:
+            logger.error("Error getting query results: %s", e)
+
+    async def get_query_results_s3_async(self, query_execution_id: str
+                                         ) -> Optional[List[List[str]]]:
+        """
+        Retrieve the results of an Athena query from its S3 output file.
+
+        :param query_execution_id: The ID of the query execution.
+        :return: The result rows, header row first, or None if an error
+        occurs.
+        """
+        try:
+            response = await self.async_athena_client.get_query_execution(
+                QueryExecutionId=query_execution_id)
+            bucket, key = _split_s3_uri(
+                response['QueryExecution']['ResultConfiguration']
+                ['OutputLocation'])
+            response = await self.async_s3_client.get_object(Bucket=bucket,
+                                                             Key=key)
+            async with response['Body'] as body:
+                data = await body.read()
+            return list(csv.reader(io.StringIO(data.decode('utf-8'))))
+        except (ClientError, KeyError) as e:
+            logger.error("Error getting query results from S3: %s", e)
+            return None
+
+    async def run_query_async(self, query: str,
+                              max_results: Optional[int] = None,
+                              poll_base: float = 0.1, poll_cap: float = 5,
+                              execution_parameters: Optional[
+                                  List[str]] = None,
+                              reuse_results: bool = True
+                              ) -> Tuple[Optional[str],
+                                         Optional[Dict[str, Any]]]:
+        """
+        Execute an Athena query, wait for it and retrieve its results.
+
+        Results are cached and concurrent calls with the same query share
+        one execution, as with run_query.
+
+        :param query: The SQL query to execute.
+        :param max_results: The maximum number of rows to return.
+        :param poll_base: The delay before the first status re-check.
+        :param poll_cap: The maximum delay between status checks.
+        :param execution_parameters: Values for the ? placeholders.
+        :param reuse_results: Allow Athena to return a recent cached result.
+        :return: The query execution ID and the query results; either is
+        None if the query could not be started or did not succeed.
+        """
+        if not reuse_results:
+            return await self._run_query_once_async(
+                query, max_results, poll_base, poll_cap, execution_parameters,
+                reuse_results)
+        cache_key = _query_cache_key(query, execution_parameters,
+                                     max_results)
+        cached = self._cached_result(cache_key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight_async.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_query_once_async(
+                query, max_results, poll_base, poll_cap, execution_parameters,
+                reuse_results, cache_key))
+            self._inflight_async[cache_key] = task
+            task.add_done_callback(
+                lambda _: self._inflight_async.pop(cache_key, None))
+        # Cancelling one caller must not cancel the query for the others.
+        return await asyncio.shield(task)
+
+    async def _run_query_once_async(
+            self, query: str, max_results: Optional[int], poll_base: float,
+            poll_cap: float, execution_parameters: Optional[List[str]],
+            reuse_results: bool, cache_key: Optional[str] = None
+            ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Execute, wait for and fetch one query for run_query_async."""
+        runtime_key = _query_text_key(query)
+        started = time.monotonic()
+        query_execution_id = await self.execute_query_async(
+            query, reuse_results, execution_parameters)
+        if not query_execution_id:
+            return None, None
+        if not await self.wait_for_query_to_complete_async(
+                query_execution_id, poll_cap, poll_base,
+                expected_runtime=self._mean_runtime.get(runtime_key)):
+            return query_execution_id, None
+        self._record_runtime(runtime_key, time.monotonic() - started)
+        results = await self.get_query_results_async(query_execution_id,
+                                                     max_results)
+        if cache_key:
+            self._cache_result(cache_key, query_execution_id, results)
+        return query_execution_id, results
+
+    async def unload_query_results_async(self, query: str,
+                                         execution_parameters: Optional[
+                                             List[str]] = None
+                                         ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Run a SELECT query as an UNLOAD and read the rows it wrote to S3.
+
+        See unload_query_results. The output files are read concurrently.
+        """
+        if not self.output_location:
+            return None
+        unload, location = _unload_query(query, self.output_location)
+        # UNLOAD results are never reused, and need an empty prefix.
+        query_execution_id = await self.execute_query_async(
+            unload, False, execution_parameters)
+        if not (query_execution_id and
+                await self.wait_for_query_to_complete_async(
+                    query_execution_id)):
+            return None
+        bucket, prefix = _split_s3_uri(location)
+
+        async def read(key: str) -> List[Dict[str, Any]]:
+            response = await self.async_s3_client.get_object(Bucket=bucket,
+                                                             Key=key)
+            async with response['Body'] as body:
+                data = await body.read()
+            return _json_lines(gzip.decompress(data).splitlines())
+
+        try:
+            paginator = self.async_s3_client.get_paginator('list_objects_v2')
+            keys = [obj['Key']
+                    async for page in paginator.paginate(Bucket=bucket,
+                                                         Prefix=prefix)
+                    for obj in page.get('Contents', [])]
+            files = await asyncio.gather(*(read(key) for key in keys))
+        except (ClientError, OSError, ValueError) as e:
+            logger.error("Error reading UNLOAD results from S3: %s", e)
+            return None
+        return [row for rows in files for row in rows]
+
+    async def check_loguid_partition_exists_async(self, loguid: str
+                                                  ) -> Optional[bool]:
+        """
+        Check the Glue catalog for a partition of a specific loguid.
+
+        See check_loguid_partition_exists.
+        """
+        if not self.table_name:
+            return None
+        try:
+            response = await self.async_glue_client.get_partitions(
+                **self._loguid_partitions_params(loguid))
+            return len(response.get('Partitions', [])) > 0
+        except ClientError as e:
+            logger.error("Error getting partitions from Glue: %s", e)
+            return None
+
+    async def check_loguid_exists_async(self, loguid: str) -> bool:
+        """
+        Check if a specific loguid exists in the Athena table.
+
+        See check_loguid_exists.
+
+        :param loguid: The loguid to check.
+        :return: True if the loguid exists, False otherwise.
+        """
+        cache_key = ('check_loguid_exists', loguid)
+        if self._lookup_cache.get(cache_key):
+            return True
+        exists = await self._query_loguid_exists_async(loguid)
+        if exists:
+            self._lookup_cache.put(cache_key, True)
+        return exists
+
+    async def _query_loguid_exists_async(self, loguid: str) -> bool:
+        """Look up whether a loguid exists, without the lookup cache."""
+        # Only a partition found is conclusive.
+        if await self.check_loguid_partition_exists_async(loguid):
+            return True
+        _, results = await self.run_query_async(
+            self.get_loguid_exists_query(), max_results=2,
+            execution_parameters=[sql_string(loguid)], reuse_results=False)
+        return _first_row_value(results, 0) == 'true'
+
+    async def get_boot_time_async(self, loguid: str,
+                                  file_type: str) -> Optional[str]:
+        """
+        Get the boot time of a log from the Athena table.
+
+        :param loguid: The loguid to get boot time for.
+        :param file_type: The log type to get data for.
+        :return: The boot time or None if an error occurs.
+        """
+        cache_key = ('get_boot_time', loguid, file_type)
+        boot_time = self._lookup_cache.get(cache_key)
+        if boot_time is None:
+            query = self.get_boot_time_query(file_type)
+            if not query:
+                return None
+            _, results = await self.run_query_async(
+                query, max_results=2,
+                execution_parameters=[sql_string(loguid)])
+            boot_time = _first_row_value(results, 1)
+            if boot_time is not None:
+                self._lookup_cache.put(cache_key, boot_time)
+        return boot_time
+
+    async def get_fc_firmware_async(self, loguid: str) -> Optional[str]:
+        """
+        Retrieve the firmware information from the telemetry data.
+
+        :param loguid: The loguid to get firmware information for.
+        :return: The firmware information or None if an error occurs.
+        """
+        query, params = self.get_fc_firmware_query(loguid)
+        _, results = await self.run_query_async(
+            query, max_results=2, execution_parameters=params)
+        return _first_row_value(results, 4)
+
+    async def count_unique_instances_async(self, loguid: str,
+                                           message_type: str,
+                                           approx: bool = True
+                                           ) -> Optional[int]:
+        """
+        Count the unique instances for a specified message type.
+
+        :param loguid: The loguid to count unique instances for.
+        :param message_type: The type of message to filter by.
+        :param approx: Use approx_distinct instead of an exact count.
+        :return: The number of unique instances or None if an error occurs.
+        """
+        query, params = self.get_unique_instance_count_query(
+            loguid, message_type, approx)
+        _, results = await self.run_query_async(
+            query, max_results=2, execution_parameters=params)
+        count = _first_row_value(results, 0)
+        return int(count) if count is not None else None
+
+    async def get_unique_instance_async(self, loguid: str,
+                                        message_type: str,
+                                        limit: Optional[int] = None
+                                        ) -> Optional[list]:
+        """
+        Retrieve the unique instances for a specified message type.
+
+        :param loguid: The loguid to get unique instances for.
+        :param message_type: The type of message to filter by.
+        :param limit: The maximum number of instances to return.
+        :return: The unique instances or None if an error occurs.
+        """
+        query, params = self.get_unique_instance_query(loguid, message_type,
+                                                       limit)
+        query_execution_id = await self.execute_query_async(
+            query, execution_parameters=params)
+        if not (query_execution_id and
+                await self.wait_for_query_to_complete_async(
+                    query_execution_id)):
+            return None
+        instances = []
+        is_header = True
+        async for row in self.iter_query_results_async(query_execution_id):
+            values = _row_values(row)
+            if is_header:
+                is_header = False
+            elif values:
+                instances.append(values[0])
+        return instances
+
+    async def get_flight_data_async(self, loguid: str, start_time: str,
+                                    file_type: str
+                                    ) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve the flight data from the telemetry data.
+
+        :param loguid: The loguid to get flight data for.
+        :param start_time: The start time of the flight.
+        :param file_type: The type of file to get data for.
+        :return: The flight data or None if an error occurs.
+        """
+        flight_query = self.get_flight_data_query(loguid, start_time,
+                                                  file_type)
+        if not flight_query:
+            return None
+        query, params = flight_query
+        _, results = await self.run_query_async(
+            query, execution_parameters=params)
+        return _parse_flight_data(results)
+
+    async def get_value_stats_async(self, loguid: str, message_type: str,
+                                    instance: int, keynames: List[str],
+                                    start_time: int, stop_time: int,
+                                    unload: bool = False
+                                    ) -> Optional[Dict[str, Dict[str, float]]]:
+        """
+        Retrieve minimum, maximum, and average values of several keynames
+        within a given time range.
+
+        :param loguid: The unique identifier of the log entry
+        :param message_type: The type of message to filter by
+        :param instance: The instance identifier to filter by
+        :param keynames: List of key names to filter by
+        :param start_time: Start timestamp of the range
+        :param stop_time: Stop timestamp of the range
+        :param unload: Run the query as an UNLOAD, see get_value_stats_multi
+        :return: Dictionary containing min, max, and avg values for each
+        keyname, or None if not found
+        """
+        stats = await self.get_value_stats_multi_async(
+            loguid, message_type, [instance], keynames, start_time,
+            stop_time, unload)
+        return stats.get(str(instance)) if stats else None
+
+    async def get_value_stats_multi_async(
+            self, loguid: str, message_type: str, instances: List[int],
+            keynames: List[str], start_time: int, stop_time: int,
+            unload: bool = False
+            ) -> Optional[Dict[str, Dict[str, Dict[str, float]]]]:
+        """
+        Retrieve minimum, maximum, and average values of several keynames
+        for several instances with a single query.
+
+        See get_value_stats_multi.
+
+        :param loguid: The unique identifier of the log entry
+        :param message_type: The type of message to filter by
+        :param instances: The instance identifiers to filter by
+        :param keynames: List of key names to filter by
+        :param start_time: Start timestamp of the range
+        :param stop_time: Stop timestamp of the range
+        :param unload: Run the query as an UNLOAD when output_location is
+        set.
+        :return: Dictionary by instance of the get_value_stats_async result
+        of that instance, or None if not found
+        """
+        if not instances:
+            return None
+        query, params = self.get_value_stats_multi_query(
+            loguid, message_type, instances, keynames, start_time, stop_time)
+        unloaded = (await self.unload_query_results_async(query, params)
+                    if unload else None)
+        if unloaded is not None:
+            return _parse_unloaded_value_stats(unloaded)
+        query_execution_id = await self.execute_query_async(
+            query, execution_parameters=params)
+        if not (query_execution_id and
+                await self.wait_for_query_to_complete_async(
+                    query_execution_id)):
+            return None
+        rows = await self.get_query_results_s3_async(query_execution_id)
+        if rows is None:
+            rows = [_row_values(row)
+                    async for row in self.iter_query_results_async(
+                        query_execution_id)]
+        return _parse_value_stats(rows)
+
+    async def get_log_summary_async(self, loguid: str, file_type: str,
+                                    start_time: str) -> Dict[str, Any]:
+        """
+        Look up the boot time, firmware and flight data of a log at once.
+
+        The three queries run concurrently.
+
+        :param loguid: The loguid to look up.
+        :param file_type: The log type, ".BIN" or ".TLOG".
+        :param start_time: The timestamp to look for a takeoff from.
+        :return: A dict with the BootTime, FCFirmware and FlightData of the
+        log, each None if it could not be found.
+        """
+        boot_time, fc_firmware, flight_data = await asyncio.gather(
+            self.get_boot_time_async(loguid, file_type),
+            self.get_fc_firmware_async(loguid),
+            self.get_flight_data_async(loguid, start_time, file_type))
+        return {
+            'BootTime': boot_time,
+            'FCFirmware': fc_firmware,
+            'FlightData': flight_data
+        }
@@ -1,65 +1,333 @@
 import logging
-import pymysql
-import json
-import boto3
-from typing import List, Dict, Optional, Tuple, Any
 import os
-from dotenv import load_dotenv
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+import pymysql
+from pymysql.constants import SERVER_STATUS
+from typing import List, Dict, Iterator, Optional, Set, Tuple, Any
 
-load_dotenv()
+from carbonix_aws_libs._aws import _LRUCache, _get_client, _json_loads
 
 logger = logging.getLogger(__name__)
 
+# Size and lifetime (seconds) of the per-handler cache of read-only lookups
+# such as log_exists and get_aircraft_uid_from_cubeid.
+LOOKUP_CACHE_SIZE = 1024
+LOOKUP_CACHE_TTL = 300
+# Hashes checked per query by logs_exist, to stay well under
+# max_allowed_packet.
+LOGS_EXIST_BATCH_SIZE = 1000
+
+# Idle connections kept per database for reuse by later handlers, e.g. by
+# the next invocation of a warm Lambda container.
+POOL_MAX_IDLE = 5
+# Pooled connections older than this many seconds are closed rather than
+# reused, well before Aurora's wait_timeout or a proxy drops them.
+POOL_CONNECTION_LIFETIME = 3600
+
+# How long (seconds) a secret fetched from Secrets Manager is reused as is.
+# An older secret is still used, but refreshed in the background, until it
+# is SECRET_MAX_STALENESS seconds old and has to be fetched before use.
+SECRET_CACHE_TTL = 900
+SECRET_MAX_STALENESS = 3600
+
+# Connection timeouts in seconds, so a dropped connection fails fast instead
+# of hanging the caller.
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+WRITE_TIMEOUT = 30
+
+# Secrets Manager secrets with the time they were fetched by (region,
+# secret_name), and idle pymysql connections by (host, port, username,
+# dbname). Both are shared by all handlers in the process.
+_SECRETS: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+_POOL: Dict[Tuple[str, int, str, str], list] = {}
+# When each open connection was made, for POOL_CONNECTION_LIFETIME.
+_CONNECTED_AT = weakref.WeakKeyDictionary()
+_LOCK = threading.Lock()
+
+# Background secret refreshes in progress, by (region, secret_name).
+_SECRET_REFRESHES: Dict[Tuple[str, str], Future] = {}
+_SECRET_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+# Threads running the queries of execute_queries, each on its own pooled
+# connection.
+QUERY_WORKERS = 4
+_QUERY_EXECUTOR = ThreadPoolExecutor(max_workers=QUERY_WORKERS)
+
+# SELECT UID queries of get_uid_by_column_str by (table, column_name), and
+# INSERT queries by (table, columns).
+_UID_QUERIES: Dict[Tuple[str, str], str] = {}
+_INSERT_QUERIES: Dict[Tuple[str, Tuple[str, ...]], str] = {}
+
+# Hot lookup queries, kept as constants so the same text is sent every time.
+_SQL_LOGS_EXIST = ("SELECT SHA256Hash FROM LogTable "
+                   "WHERE SHA256Hash IN ({placeholders})")
+# The aircraft a Cube was fitted to at a timestamp, with the select list
+# left to fill in; every %s after the serial number is the same timestamp.
+_SQL_AIRCRAFT_BY_CUBEID = """
+    SELECT {columns}
+    FROM AircraftSubComponentLink AS ASCL
+    JOIN SubComponentUnits AS SCU ON ASCL.SubComponentUnitID = SCU.UID
+    JOIN AircraftTable AS AT ON ASCL.AircraftID = AT.UID
+    WHERE SCU.SerialNumber = %s
+        AND ASCL.StartDate <= FROM_UNIXTIME(%s)
+        AND (ASCL.EndDate IS NULL OR ASCL.EndDate >= FROM_UNIXTIME(%s))
+"""
+_SQL_AIRCRAFT_UID_AND_NAME_BY_CUBEID = _SQL_AIRCRAFT_BY_CUBEID.format(
+    columns="ASCL.AircraftID, AT.AircraftName")
+_SQL_AIRCRAFT_ROW_BY_CUBEID = _SQL_AIRCRAFT_BY_CUBEID.format(
+    columns="AT.*")
+# The take-off and landing locations are bound as longitude, latitude pairs.
+_SQL_INSERT_FLIGHT = """
+    INSERT INTO FlightTable (
+        TakeoffTime, TakeoffTimeBoot, LandingTime, Duration, PilotID,
+        TakeoffLocation, LandingLocation, GSOID, version, FlightID
+    )
+    VALUES (%s, %s, %s, %s, %s, POINT(%s, %s), POINT(%s, %s), %s, %s, %s)
+"""
+
+
+def _insert_query(table: str, columns: Tuple[str, ...]) -> str:
+    """The INSERT query of a table and column set, built once per set."""
+    query = _INSERT_QUERIES.get((table, columns))
+    if query is None:
+        placeholders = ", ".join(["%s"] * len(columns))
+        query = _INSERT_QUERIES.setdefault(
+            (table, columns),
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({placeholders})")
+    return query
+
+
+def _fetch_secret(region_name: str,
+                  secret_name: str) -> Optional[Dict[str, Any]]:
+    """Fetch a secret from Secrets Manager and cache it."""
+    client = _get_client('secretsmanager', region_name)
+    try:
+        response = client.get_secret_value(SecretId=secret_name)
+        secret = _json_loads(response['SecretString'])
+        logger.debug("Secret retrieved successfully from Secrets Manager.")
+    except Exception as e:
+        logger.error(f"Error retrieving secret: {e}")
+        return None
+    with _LOCK:
+        _SECRETS[(region_name, secret_name)] = (time.monotonic(), secret)
+    return secret
+
+
+def _refresh_secret(key: Tuple[str, str]) -> None:
+    """Start a background refresh of a secret, unless one is running."""
+    with _LOCK:
+        if key in _SECRET_REFRESHES:
+            return
+        future = _SECRET_REFRESHES[key] = _SECRET_EXECUTOR.submit(
+            _fetch_secret, *key)
+
+    def done(_):
+        with _LOCK:
+            _SECRET_REFRESHES.pop(key, None)
+    future.add_done_callback(done)
+
+
+def _pool_key(db_credentials: Dict[str, str]) -> Tuple[str, int, str, str]:
+    """The connection pool key of a set of database credentials."""
+    return (db_credentials['host'], int(db_credentials['port']),
+            db_credentials['username'], db_credentials['dbname'])
+
+
+def _connection_expired(connection: pymysql.connections.Connection) -> bool:
+    """Whether a connection has outlived POOL_CONNECTION_LIFETIME."""
+    with _LOCK:
+        connected_at = _CONNECTED_AT.get(connection)
+    return (connected_at is not None and
+            time.monotonic() - connected_at > POOL_CONNECTION_LIFETIME)
+
+
+def _acquire_connection(db_credentials: Dict[str, str]
+                        ) -> pymysql.connections.Connection:
+    """
+    Take an idle pooled connection to the database, or open a new one.
+
+    Pooled connections are pinged before they are handed out, and ones the
+    server has dropped or that are past POOL_CONNECTION_LIFETIME are
+    discarded. New connections use autocommit, so a
+    single statement needs no separate COMMIT round trip, and utf8mb4 so
+    that no SET NAMES is needed for non-ASCII text.
+    """
+    key = _pool_key(db_credentials)
+    while True:
+        with _LOCK:
+            idle = _POOL.get(key)
+            connection = idle.pop() if idle else None
+        if connection is None:
+            break
+        try:
+            if not _connection_expired(connection):
+                connection.ping(reconnect=False)
+                logger.debug("Reusing pooled database connection.")
+                return connection
+        except pymysql.MySQLError:
+            pass
+        logger.debug("Discarding stale pooled database connection.")
+        try:
+            connection.close()
+        except pymysql.MySQLError:
+            pass
+    return _connect(db_credentials)
+
+
+def _connect(db_credentials: Dict[str, str],
+             **kwargs: Any) -> pymysql.connections.Connection:
+    """Open a new connection to the database, see _acquire_connection."""
+    connection = pymysql.connect(
+        host=db_credentials['host'],
+        user=db_credentials['username'],
+        password=db_credentials['password'],
+        db=db_credentials['dbname'],
+        port=int(db_credentials['port']),
+        autocommit=True,
+        charset='utf8mb4',
+        use_unicode=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        write_timeout=WRITE_TIMEOUT,
+        **kwargs
+    )
+    with _LOCK:
+        _CONNECTED_AT[connection] = time.monotonic()
+    return connection
+
+
+def _load_data_field(value: Any) -> str:
+    """
+    A value as a field of the file read by _bulk_load.
+
+    Values are enclosed in double quotes, with any inside doubled, and None
+    is the bare word NULL, which LOAD DATA reads as NULL.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        value = int(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _release_connection(db_credentials: Dict[str, str],
+                        connection: pymysql.connections.Connection) -> None:
+    """
+    Return a connection to the pool, or close it if the pool is full.
+
+    Any open transaction is rolled back, so the next user starts clean.
+    """
+    if not connection.open:
+        return
+    if _connection_expired(connection):
+        connection.close()
+        return
+    try:
+        if connection.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            connection.rollback()
+    except pymysql.MySQLError:
+        connection.close()
+        return
+    with _LOCK:
+        idle = _POOL.setdefault(_pool_key(db_credentials), [])
+        if len(idle) < POOL_MAX_IDLE:
+            idle.append(connection)
+            return
+    connection.close()
+
 
 class AuroraHandler:
     def __init__(self, db_credentials: Dict[str, str]):
         """
-        Initialize the AuroraHandler instance with database credentials 
-        and establish a connection.
+        Initialize the AuroraHandler instance with database credentials.
+
+        The password is retrieved from Secrets Manager and the connection is
+        opened on first use, so a handler that never queries the database
+        costs nothing to create.
         """
         self.db_credentials = db_credentials
         self.connection = None
-        self.init_state = False
-        self.retrieve_db_credentials()
-        self.init_state = self.connect()
-
-    def retrieve_db_credentials(self) -> None:
-        """Retrieve and store database credentials from AWS Secrets Manager."""
-        client = boto3.session.Session().client(
-            service_name='secretsmanager',
-            region_name=self.db_credentials['region']
-        )
-        try:
-            response = client.get_secret_value(
-                SecretId=self.db_credentials['secret_name'])
-            secret = json.loads(response['SecretString'])
-            self.db_credentials['password'] = secret['password']
-            logger.debug("Secret retrieved successfully from Secrets Manager.")
-        except Exception as e:
-            logger.error(f"Error retrieving secret: {e}")
+        self._lookup_cache = _LRUCache(LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL)
+        self._credentials_retrieved = False
+        # Set inside transaction(), and whether a statement in it failed.
+        self._in_tx = False
+        self._tx_failed = False
+
+    @property
+    def init_state(self) -> bool:
+        """Whether the handler is connected, connecting if not yet."""
+        return self._ensure_connection()
+
+    def _ensure_connection(self) -> bool:
+        """Connect on first use, retrieving the credentials if needed."""
+        if self.connection is not None:
+            return True
+        if not self._credentials_retrieved:
+            self.retrieve_db_credentials()
+        return self.connect()
+
+    def retrieve_db_credentials(self, refresh: bool = False) -> None:
+        """
+        Retrieve and store database credentials from AWS Secrets Manager.
+
+        The secret is shared by all handlers in the process. Once it is
+        older than SECRET_CACHE_TTL it is refreshed in the background while
+        the cached value is still used, so Secrets Manager is only waited
+        on when there is no secret yet, it is older than
+        SECRET_MAX_STALENESS, or refresh is set, e.g. after a rotation.
+        """
+        key = (self.db_credentials['region'],
+               self.db_credentials['secret_name'])
+        with _LOCK:
+            entry = _SECRETS.get(key)
+        age = time.monotonic() - entry[0] if entry else None
+        if refresh or age is None or age >= SECRET_MAX_STALENESS:
+            secret = _fetch_secret(*key)
+            if secret is None:
+                return
+        else:
+            secret = entry[1]
+            if age >= SECRET_CACHE_TTL:
+                _refresh_secret(key)
+        self.db_credentials['password'] = secret['password']
+        self._credentials_retrieved = True
 
     def reconnect(self) -> bool:
-        """Reconnect to the database."""
+        """
+        Reconnect to the database.
+
+        The cached secret is tried first; it is only fetched again if the
+        connection fails, e.g. because the password was rotated.
+        """
         logger.debug("Reconnecting to the database...")
         if self.connection:
             self.close_connection()
         self.retrieve_db_credentials()
+        if self.connect():
+            return True
+        self.retrieve_db_credentials(refresh=True)
         return self.connect()
 
     def connected(self) -> bool:
         """Check if the handler is connected to the database."""
-        return self.connection
+        return self.connection is not None
 
     def connect(self) -> bool:
-        """Establish a connection to the RDS database."""
+        """
+        Establish a connection to the RDS database.
+
+        The connection is taken from the process-wide pool when an idle one
+        is available, which skips the TCP, TLS and authentication handshake.
+        """
         try:
-            self.connection = pymysql.connect(
-                host=self.db_credentials['host'],
-                user=self.db_credentials['username'],
-                password=self.db_credentials['password'],
-                db=self.db_credentials['dbname'],
-                port=int(self.db_credentials['port'])
-            )
+            self.connection = _acquire_connection(self.db_credentials)
             logger.info("Connected to the database successfully.")
             return True
         except Exception as e:
@@ -67,52 +335,311 @@ class AuroraHandler:
             return False
 
     def close_connection(self) -> None:
-        """Close the database connection if open."""
+        """Release the database connection, if open, back to the pool."""
         if self.connection:
             try:
-                self.connection.close()
-                logger.debug("Database connection closed.")
+                _release_connection(self.db_credentials, self.connection)
+                logger.debug("Database connection released.")
             except pymysql.MySQLError as e:
                 logger.error(f"Error closing connection: {e}")
             finally:
                 self.connection = None
 
+    def clear_cache(self) -> None:
+        """Forget all cached lookup results."""
+        self._lookup_cache.clear()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Run the inserts and updates made inside the block as one transaction.
+
+        The statements are not committed one by one but together on exit,
+        which saves a commit, and a log flush on the writer, per statement.
+        If any of them fails, or the block raises, everything is rolled
+        back instead::
+
+            with handler.transaction():
+                for row in rows:
+                    handler.insert_summary(row)
+        """
+        if self._in_tx:
+            yield
+            return
+        if not self._ensure_connection():
+            raise pymysql.OperationalError("Database connection failed.")
+        self.connection.begin()
+        self._in_tx = True
+        self._tx_failed = False
+        try:
+            yield
+        except BaseException:
+            self._rollback()
+            raise
+        else:
+            if self._tx_failed:
+                logger.error("Rolling back transaction after a failed "
+                             "statement.")
+                self._rollback()
+            else:
+                self.connection.commit()
+        finally:
+            self._in_tx = False
+
+    def _statement_failed(self) -> None:
+        """
+        Roll back after a failed insert or update.
+
+        Inside transaction() the rollback is left to the end of the block,
+        so that later statements do not run outside the transaction.
+        """
+        if self._in_tx:
+            self._tx_failed = True
+        else:
+            self.connection.rollback()
+
+    def _rollback(self) -> None:
+        """Roll back, forgetting lookups that may refer to rolled back rows."""
+        try:
+            self.connection.rollback()
+        finally:
+            self.clear_cache()
+
     def execute_query(self, query: str, params: Optional[Tuple] = None,
-                      fetchone: bool = False):
-        """Execute a query and return results if applicable."""
-        if not self.connection and not self.connect():
+                      fetchone: bool = False, dict_rows: bool = False,
+                      stream: bool = False):
+        """
+        Execute a query and return results if applicable.
+
+        Rows are tuples, or dicts keyed by column name when dict_rows is set.
+        With stream set, an iterator over the rows is returned instead of a
+        list. It reads them from the server as they are consumed, so memory
+        use does not grow with the size of the result; no other query can
+        run on the connection until the iterator is exhausted or closed.
+        """
+        if not self._ensure_connection():
             logger.error("Database connection failed.")
             return None
+        if stream:
+            return self._iter_query(query, params, dict_rows)
+        cursor_class = pymysql.cursors.DictCursor if dict_rows else None
         try:
-            with self.connection.cursor() as cursor:
+            with self.connection.cursor(cursor_class) as cursor:
                 cursor.execute(query, params)
                 return cursor.fetchone() if fetchone else cursor.fetchall()
         except Exception as e:
             logger.error(f"Query execution error: {e}")
             return None
 
+    def execute_queries(self, specs: List[Tuple[str, Optional[Tuple]]],
+                        dict_rows: bool = False) -> List[Optional[list]]:
+        """
+        Execute several independent queries concurrently.
+
+        Each query runs in a worker thread on its own connection from the
+        pool, so the total wait is that of the slowest query rather than
+        the sum of them all. The queries do not see uncommitted changes
+        made inside transaction().
+
+        :param specs: Each query with its parameters.
+        :param dict_rows: Whether rows are dicts keyed by column name.
+        :return: The rows of each query, in the order given, or None for a
+            query that failed.
+        """
+        if not self._credentials_retrieved:
+            self.retrieve_db_credentials()
+        futures = [_QUERY_EXECUTOR.submit(self._pooled_query, query, params,
+                                          dict_rows)
+                   for query, params in specs]
+        return [future.result() for future in futures]
+
+    def _pooled_query(self, query: str, params: Optional[Tuple],
+                      dict_rows: bool) -> Optional[list]:
+        """Execute a query on a connection borrowed from the pool."""
+        cursor_class = pymysql.cursors.DictCursor if dict_rows else None
+        try:
+            connection = _acquire_connection(self.db_credentials)
+        except Exception as e:
+            logger.error(f"Database connection error: {e}")
+            return None
+        try:
+            with connection.cursor(cursor_class) as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Query execution error: {e}")
+            return None
+        finally:
+            _release_connection(self.db_credentials, connection)
+
+    def _iter_query(self, query: str, params: Optional[Tuple],
+                    dict_rows: bool) -> Iterator:
+        """Execute a query with an unbuffered cursor and yield its rows."""
+        cursor_class = (pymysql.cursors.SSDictCursor if dict_rows
+                        else pymysql.cursors.SSCursor)
+        try:
+            with self.connection.cursor(cursor_class) as cursor:
+                cursor.execute(query, params)
+                yield from cursor
+        except Exception as e:
+            logger.error(f"Query execution error: {e}")
+
     def execute_insert_or_update(self, query: str, params: Tuple) -> bool:
-        """Execute an insert or update query and commit the transaction."""
-        if not self.connection and not self.connect():
+        """
+        Execute an insert or update query.
+
+        The connection is in autocommit mode, so the statement is committed
+        as soon as it succeeds, unless it is made inside transaction().
+        """
+        if not self._ensure_connection():
             logger.error("Database connection failed.")
             return False
         try:
             with self.connection.cursor() as cursor:
                 cursor.execute(query, params)
+            return True
+        except Exception as e:
+            logger.error(f"Transaction error: {e}")
+            self._statement_failed()
+            return False
+
+    def execute_many(self, query: str, params_list: List[Tuple]) -> bool:
+        """
+        Execute an insert or update query for each set of parameters and
+        commit them together as one transaction.
+
+        pymysql sends an INSERT ... VALUES as multi-row statements, so the
+        rows take a few round trips and a single commit instead of one each.
+        """
+        return self.execute_batches([(query, params_list)])
+
+    def execute_batches(self, batches: List[Tuple[str, List[Tuple]]]
+                        ) -> bool:
+        """
+        Run execute_many for several queries, all in one transaction.
+
+        Inside transaction() the queries join that transaction instead.
+
+        :param batches: Each query with its list of parameter sets.
+        :return: True if every query succeeded and was committed.
+        """
+        batches = [(query, params_list) for query, params_list in batches
+                   if params_list]
+        if not batches:
+            return True
+        if not self._ensure_connection():
+            logger.error("Database connection failed.")
+            return False
+        try:
+            if not self._in_tx:
+                self.connection.begin()
+            with self.connection.cursor() as cursor:
+                for query, params_list in batches:
+                    cursor.executemany(query, params_list)
+            if not self._in_tx:
                 self.connection.commit()
             return True
         except Exception as e:
             logger.error(f"Transaction error: {e}")
-            self.connection.rollback()
+            self._statement_failed()
             return False
 
+    def _insert(self, table: str, data: Dict[str, Optional[str]]) -> bool:
+        """Insert a record with the columns of data that are not None."""
+        columns = tuple(key for key in data if data[key] is not None)
+        return self.execute_insert_or_update(
+            _insert_query(table, columns),
+            tuple(data[key] for key in columns))
+
+    def _insert_many(self, table: str,
+                     rows: List[Dict[str, Optional[str]]]) -> bool:
+        """
+        Insert several records into a table in one transaction.
+
+        As with a single insert, each row only sets its columns that are not
+        None, so the others keep their defaults. Rows are grouped by that
+        column set and each group is one executemany.
+        """
+        groups = {}
+        for row in rows:
+            columns = tuple(key for key in row if row[key] is not None)
+            if columns:
+                groups.setdefault(columns, []).append(
+                    tuple(row[key] for key in columns))
+        return self.execute_batches(
+            [(_insert_query(table, columns), params_list)
+             for columns, params_list in groups.items()])
+
+    def _bulk_load(self, table: str,
+                   rows: List[Dict[str, Optional[str]]]) -> bool:
+        """
+        Insert many records into a table with LOAD DATA LOCAL INFILE.
+
+        The rows are written to a temporary file that the server reads in
+        one statement per column set, which for tens of thousands of rows
+        is much faster than INSERT. Columns are set as in _insert_many.
+
+        This needs local_infile enabled on the server, and runs on a
+        connection of its own, outside of any transaction().
+        """
+        groups = {}
+        for row in rows:
+            columns = tuple(key for key in row if row[key] is not None)
+            if columns:
+                groups.setdefault(columns, []).append(row)
+        if not groups:
+            return True
+        if not self._credentials_retrieved:
+            self.retrieve_db_credentials()
+        paths = []
+        connection = None
+        try:
+            for columns, group in groups.items():
+                with tempfile.NamedTemporaryFile(
+                        'w', encoding='utf-8', newline='', suffix='.csv',
+                        delete=False) as f:
+                    paths.append(f.name)
+                    for row in group:
+                        f.write(",".join(_load_data_field(row[key])
+                                         for key in columns) + "\n")
+            connection = _connect(self.db_credentials, local_infile=True)
+            connection.begin()
+            with connection.cursor() as cursor:
+                for path, columns in zip(paths, groups):
+                    cursor.execute(
+                        f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+                        f"CHARACTER SET utf8mb4 "
+                        f"FIELDS TERMINATED BY ',' ENCLOSED BY '\"' "
+                        f"ESCAPED BY '' LINES TERMINATED BY '\\n' "
+                        f"({', '.join(columns)})", (path,))
+            connection.commit()
+            logger.debug(f"Loaded {len(rows)} rows into {table}")
+            return True
+        except Exception as e:
+            logger.error(f"Bulk load error: {e}")
+            return False
+        finally:
+            if connection is not None:
+                connection.close()
+            for path in paths:
+                os.remove(path)
+
     def get_uid_by_column_str(self, table: str, column_name: str,
                               stringValue: str) -> Optional[str]:
         """Retrieve UID from specified table based on the TypeName."""
-        query = f"SELECT UID FROM {table} WHERE {column_name} = %s"
+        cache_key = ('get_uid_by_column_str', table, column_name, stringValue)
+        uid = self._lookup_cache.get(cache_key)
+        if uid is not None:
+            return uid
+        query = _UID_QUERIES.get((table, column_name))
+        if query is None:
+            query = _UID_QUERIES.setdefault(
+                (table, column_name),
+                f"SELECT UID FROM {table} WHERE {column_name} = %s")
         result = self.execute_query(query, (stringValue,), fetchone=True)
         if result:
             logger.debug(f"{stringValue} found in {table}")
+            self._lookup_cache.put(cache_key, result[0])
             return result[0]
         logger.info(f"FAILED: {stringValue} not found in {table}")
         return None
@@ -120,33 +647,82 @@ class AuroraHandler:
     def insert_summary(self, data: Dict[str, Optional[str]]) -> bool:
         """Insert a new record into the SummaryTable."""
         logger.debug(f"Inserting summary data: {data}")
-        columns = [key for key in data if data[key] is not None]
-        values = [data[key] for key in columns]
-        placeholders = ", ".join(["%s"] * len(values))
-        query = f"INSERT INTO SummaryTable ({', '.join(columns)}) VALUES ({placeholders})" # noqa
-        return self.execute_insert_or_update(query, tuple(values))
+        return self._insert("SummaryTable", data)
+
+    def insert_summaries(self, rows: List[Dict[str, Optional[str]]]) -> bool:
+        """Insert several records into the SummaryTable in one transaction."""
+        logger.debug(f"Inserting {len(rows)} summary rows")
+        return self._insert_many("SummaryTable", rows)
+
+    def bulk_load_summaries(self,
+                            rows: List[Dict[str, Optional[str]]]) -> bool:
+        """
+        Insert a large number of records into the SummaryTable.
+
+        Like insert_summaries, but with LOAD DATA LOCAL INFILE, see
+        _bulk_load.
+        """
+        logger.debug(f"Bulk loading {len(rows)} summary rows")
+        return self._bulk_load("SummaryTable", rows)
 
     def insert_error(self, data: Dict[str, Optional[str]]) -> bool:
         """Insert a new record into the ErrorTable."""
-        columns = [key for key in data if data[key] is not None]
-        values = [data[key] for key in columns]
-        placeholders = ", ".join(["%s"] * len(values))
-        query = f"INSERT INTO ErrorTable ({', '.join(columns)}) VALUES ({placeholders})" # noqa
-        return self.execute_insert_or_update(query, tuple(values))
+        return self._insert("ErrorTable", data)
+
+    def insert_errors(self, rows: List[Dict[str, Optional[str]]]) -> bool:
+        """Insert several records into the ErrorTable in one transaction."""
+        return self._insert_many("ErrorTable", rows)
+
+    def bulk_load_errors(self, rows: List[Dict[str, Optional[str]]]) -> bool:
+        """
+        Insert a large number of records into the ErrorTable.
+
+        Like insert_errors, but with LOAD DATA LOCAL INFILE, see _bulk_load.
+        """
+        return self._bulk_load("ErrorTable", rows)
 
     def log_exists(self, sha256hash: str) -> bool:
         """Check if a log exists in LogTable by SHA256Hash."""
-        query = "SELECT COUNT(1) FROM LogTable WHERE SHA256Hash = %s"
-        result = self.execute_query(query, (sha256hash,), fetchone=True)
-        return result[0] > 0 if result else False
+        return sha256hash in self.logs_exist([sha256hash])
+
+    def logs_exist(self, sha256hashes: List[str]) -> Set[str]:
+        """
+        Check which of several logs exist in LogTable by SHA256Hash.
+
+        The hashes are looked up LOGS_EXIST_BATCH_SIZE per query rather
+        than one query each. Only positive results are cached, since a
+        missing log may be inserted at any time. Hashes are compared
+        ignoring case, as the SHA256Hash column collation does.
+
+        :param sha256hashes: The hashes to check.
+        :return: The subset of the hashes found in LogTable, as given.
+        """
+        found = set()
+        # The given spellings of each missing hash, by lower case hash.
+        missing = {}
+        for sha256hash in dict.fromkeys(sha256hashes):
+            if self._lookup_cache.get(('log_exists', sha256hash.lower())):
+                found.add(sha256hash)
+            else:
+                missing.setdefault(sha256hash.lower(), []).append(sha256hash)
+        batches = [spellings[0] for spellings in missing.values()]
+        for start in range(0, len(batches), LOGS_EXIST_BATCH_SIZE):
+            batch = batches[start:start + LOGS_EXIST_BATCH_SIZE]
+            query = _SQL_LOGS_EXIST.format(
+                placeholders=", ".join(["%s"] * len(batch)))
+            for (sha256hash,) in self.execute_query(query, tuple(batch)) or ():
+                self._lookup_cache.put(('log_exists', sha256hash.lower()),
+                                       True)
+                found.update(missing.get(sha256hash.lower(), ()))
+        return found
 
     def insert_log(self, log_data: Dict[str, Optional[str]]) -> bool:
         """Insert a log entry into LogTable."""
-        columns = [key for key in log_data if log_data[key] is not None]
-        values = [log_data[key] for key in columns]
-        placeholders = ", ".join(["%s"] * len(values))
-        query = f"INSERT INTO LogTable ({', '.join(columns)}) VALUES ({placeholders})" # noqa
-        return self.execute_insert_or_update(query, tuple(values))
+        inserted = self._insert("LogTable", log_data)
+        if inserted and log_data.get('SHA256Hash'):
+            self._lookup_cache.put(
+                ('log_exists', log_data['SHA256Hash'].lower()), True)
+        return inserted
 
     def update_telemetry_info(self, sha256hash: str, version: str,
                               path: str) -> bool:
@@ -163,31 +739,21 @@ class AuroraHandler:
                               flight_data: Dict[str, Optional[str]]
                               ) -> Optional[str]:
         """Insert a new flight entry into the FlightTable."""
-        if not self.connection:
-            self.connect()
-
-        if not self.connection:
+        if not self._ensure_connection():
             return False
 
         try:
             with self.connection.cursor() as cursor:
-                sql = """
-                    INSERT INTO FlightTable (
-                        TakeoffTime, TakeoffTimeBoot, LandingTime, Duration, PilotID,  # noqa
-                        TakeoffLocation, LandingLocation, GSOID, version, FlightID     # noqa
-                    )
-                    VALUES (%s, %s, %s, %s, %s, ST_PointFromText(%s), ST_PointFromText(%s), %s, %s, %s)   # noqa
-                """
-                takeoff_point = f"POINT({flight_data['TakeoffLong']} {flight_data['TakeoffLat']})"   # noqa
-                landing_point = f"POINT({flight_data['LandingLong']} {flight_data['LandingLat']})"   # noqa
-
-                cursor.execute(sql, (
+                cursor.execute(_SQL_INSERT_FLIGHT, (
                     flight_data['TakeoffTimestampStr'],
                     flight_data['BootTimestampStr'],
                     flight_data['LandingTimestampStr'],
                     flight_data['TotalFlightTime'],
                     flight_data['PilotUID'],
-                    takeoff_point, landing_point,
+                    float(flight_data['TakeoffLong']),
+                    float(flight_data['TakeoffLat']),
+                    float(flight_data['LandingLong']),
+                    float(flight_data['LandingLat']),
                     flight_data['GSOUID'],
                     flight_data['Version'],
                     flight_data['FlightID']
@@ -195,14 +761,12 @@ class AuroraHandler:
 
                 # Get the last inserted UID
                 uid = cursor.lastrowid
-                self.connection.commit()
                 logger.debug(f"Record added successfully with UID: {uid}")
                 return uid
         except Exception as e:
             logger.error(f"{e}")
+            self._statement_failed()
             return None
-        finally:
-            self.close_connection()
 
     def add_flight_file_record(self, flight_uid: str, log_uid: str) -> bool:
         """Add a record to the FlightFile table linking flight, log entries."""
@@ -214,46 +778,51 @@ class AuroraHandler:
         """
         Retrieve aircraft details and Aircraft Model details based on LogUID.
 
+        The aircraft is looked up through the log in one query, then its
+        model. Model columns override aircraft columns of the same name,
+        so the two UIDs are also returned as aircraft_uid and model_uid.
+
         :param log_uid: The unique identifier of the log entry.
         :return: Dictionary containing aircraft and model details, or None.
         """
-        # From LogTable using LogUID, get AircraftID
-        query = "SELECT AircraftID FROM LogTable WHERE UID = %s"
-        result = self.execute_query(query, (log_uid,), fetchone=True)
-        if not result:
-            logger.info(f"FAILED: No AircraftID found for LogUID: {log_uid}")
-            return None
-        aircraft_uid = result[0]
-        logger.debug(f"AircraftUID: {aircraft_uid}")
-
-        # From AircraftTable using AircraftID, get the data for the aircraft
-        query = "SELECT * FROM AircraftTable WHERE UID = %s"
-        result = self.execute_query(query, (aircraft_uid,), fetchone=True)
-        if not result:
+        query = """
+            SELECT AT.*
+            FROM LogTable AS LT
+            JOIN AircraftTable AS AT ON AT.UID = LT.AircraftID
+            WHERE LT.UID = %s
+        """
+        aircraft = self.execute_query(query, (log_uid,), fetchone=True,
+                                      dict_rows=True)
+        if not aircraft:
             logger.info(f"FAILED: No aircraft found for LogUID: {log_uid}")
             return None
-        aircraft_details = result
-        aircraft_model_uid = aircraft_details[3]
+        logger.debug(f"AircraftUID: {aircraft['UID']}")
+        # The model UID is the fourth column of AircraftTable.
+        aircraft_model_uid = list(aircraft.values())[3]
         logger.debug(f"AircraftModelUID: {aircraft_model_uid}")
-        # From AircraftModel using AircraftModelID, get the data for the model
+
         query = "SELECT * FROM AircraftModel WHERE UID = %s"
-        result = self.execute_query(query, (aircraft_model_uid,),
-                                    fetchone=True)
-        if not result:
+        model = self.execute_query(query, (aircraft_model_uid,),
+                                   fetchone=True, dict_rows=True)
+        if not model:
             logger.info(f"FAILED: No model found for LogUID: {log_uid}")
             return None
-        model_details = result
 
         # Combine the aircraft and model details into a single dictionary
-        aircraft_details.update(model_details)
+        aircraft_details = {**aircraft, **model}
+        aircraft_details['aircraft_uid'] = aircraft['UID']
+        aircraft_details['model_uid'] = model['UID']
         return aircraft_details
 
-    def get_all_logs_by_aircraft_uid(self, aircraft_id: int
+    def get_all_logs_by_aircraft_uid(self, aircraft_id: int,
+                                     stream: bool = False
                                      ) -> Optional[List[Dict[str, str]]]:
         """
         Retrieve all logs with a specific aircraft based on AircraftID.
 
         :param aircraft_id: The unique identifier of the aircraft.
+        :param stream: Return an iterator that streams the logs from the
+        server instead of a list, see execute_query.
         :return: List of dictionaries containing log details, or None.
         """
         try:
@@ -262,16 +831,15 @@ class AuroraHandler:
                 FROM LogTable
                 WHERE AircraftID = %s
             """
-            result = self.execute_query(query, (aircraft_id,))
+            if stream:
+                return self.execute_query(query, (aircraft_id,),
+                                          dict_rows=True, stream=True)
+            logs = self.execute_query(query, (aircraft_id,), dict_rows=True)
 
-            if not result:
+            if not logs:
                 logger.info(f"FAILED: No logs found AircraftID: {aircraft_id}")
                 return None
 
-            # Convert each result tuple to a dictionary
-            logs = [dict(zip([col[0] for col in self.cursor.description],
-                             row)) for row in result]
-
             return logs
 
         except Exception as e:
@@ -288,14 +856,13 @@ class AuroraHandler:
         """
         try:
             query = """
-                SELECT PilotID, UTCTimeOffset, TakeoffTime, TakeoffTimeBoot, LandingTime,   # noqa
-                    TakeoffLocation, LandingLocation, Duration, GSOID, version, FlightID    # noqa
-                FROM FlightTable
-                WHERE UID IN (
-                    SELECT FlightID FROM FlightFile WHERE LogID IN (
-                        SELECT UID FROM LogTable WHERE AircraftID = %s
-                    )
-                )
+                SELECT F.PilotID, F.UTCTimeOffset, F.TakeoffTime, F.TakeoffTimeBoot, F.LandingTime,   # noqa
+                    F.TakeoffLocation, F.LandingLocation, F.Duration, F.GSOID, F.version, F.FlightID    # noqa
+                FROM FlightTable AS F
+                JOIN FlightFile AS FF ON FF.FlightID = F.UID
+                JOIN LogTable AS L ON L.UID = FF.LogID
+                WHERE L.AircraftID = %s
+                GROUP BY F.UID
             """
             result = self.execute_query(query, (aircraft_id,))
 
@@ -310,22 +877,26 @@ class AuroraHandler:
             logger.error(f"Error for flight AircraftID {aircraft_id}: {e}")
             return None
 
-    def get_all_summary_for_flight_uid(self, flight_uid: int
+    def get_all_summary_for_flight_uid(self, flight_uid: int,
+                                       stream: bool = False
                                        ) -> Optional[Dict[str, str]]:
         """
         Retrieve all summaries for a specific flight based on FlightUID.
 
         :param flight_uid: The unique identifier of the flight.
+        :param stream: Return an iterator that streams the summaries from
+        the server, see execute_query. Rows are tuples either way.
         :return: Dictionary containing summary details, or None if not found.
         """
         try:
             query = """
-                SELECT LogID, FlightID, Message, Value, Unit, Version, TypeID, ProcessedDate, Instance # noqa
-                FROM SummaryTable
-                WHERE LogID IN (
-                    SELECT LogID FROM FlightFile WHERE FlightID = %s
-                )
+                SELECT S.LogID, S.FlightID, S.Message, S.Value, S.Unit, S.Version, S.TypeID, S.ProcessedDate, S.Instance # noqa
+                FROM SummaryTable AS S
+                JOIN FlightFile AS FF ON FF.LogID = S.LogID
+                WHERE FF.FlightID = %s
             """
+            if stream:
+                return self.execute_query(query, (flight_uid,), stream=True)
             result = self.execute_query(query, (flight_uid,))
 
             if not result:
@@ -338,24 +909,28 @@ class AuroraHandler:
             logger.error(f"Error retrieving summary {flight_uid}: {e}")
             return None
 
-    def get_all_errors_for_flight_uid(self, flight_uid: int
+    def get_all_errors_for_flight_uid(self, flight_uid: int,
+                                      stream: bool = False
                                       ) -> Optional[Dict[str, str]]:
         """
         Retrieve all errors associated with a specific flight based FlightUID.
 
         :param flight_uid: The unique identifier of the flight.
+        :param stream: Return an iterator that streams the errors from the
+        server, see execute_query. Rows are tuples either way.
         :return: Dictionary containing error details, or None if not found.
         """
         try:
             query = """
-                SELECT LogID, FlightID, Message, Severity, ErrorStartTimestamp, ErrorClearTimestamp, # noqa
-                ErrorDuration, Comment, ReportedByUserID, ResolvedStatus, ResolvedUserID,  # noqa
-                ResolutionComment, Version, TypeID, ProcessedDate, Instance
-                FROM ErrorTable
-                WHERE LogID IN (
-                    SELECT LogID FROM FlightFile WHERE FlightID = %s
-                )
+                SELECT E.LogID, E.FlightID, E.Message, E.Severity, E.ErrorStartTimestamp, E.ErrorClearTimestamp, # noqa
+                E.ErrorDuration, E.Comment, E.ReportedByUserID, E.ResolvedStatus, E.ResolvedUserID,  # noqa
+                E.ResolutionComment, E.Version, E.TypeID, E.ProcessedDate, E.Instance  # noqa
+                FROM ErrorTable AS E
+                JOIN FlightFile AS FF ON FF.LogID = E.LogID
+                WHERE FF.FlightID = %s
             """
+            if stream:
+                return self.execute_query(query, (flight_uid,), stream=True)
             result = self.execute_query(query, (flight_uid,))
 
             if not result:
@@ -368,41 +943,50 @@ class AuroraHandler:
             logger.error(f"Error retrieving error FlightUID {flight_uid}: {e}")
             return None
 
-    def get_aircraft_uid_from_cubeid(self, cube_id: str,
-                                     timestamp: str) -> Optional[str]:
+    def get_aircraft_uid_and_name_from_cubeid(self, cube_id: str,
+                                              timestamp: str
+                                              ) -> Optional[Tuple[int, str]]:
         """
-        Retrieve the aircraft UID based on the CubeID and timestamp.
+        Retrieve the aircraft UID and name based on the CubeID and timestamp.
 
         :param cube_id: The unique identifier of the Cube.
         :param timestamp: The timestamp of the log.
-        :return: The UID of the aircraft, or None if not found.
+        :return: The UID and name of the aircraft, or None if not found.
         """
+        cache_key = ('get_aircraft_uid_and_name_from_cubeid', cube_id,
+                     timestamp)
+        cached = self._lookup_cache.get(cache_key)
+        if cached is not None:
+            return cached
         try:
-            query = """
-                SELECT 
-                    ASCL.AircraftID
-                FROM 
-                    AircraftSubComponentLink AS ASCL
-                JOIN 
-                    SubComponentUnits AS SCU
-                    ON ASCL.SubComponentUnitID = SCU.UID
-                WHERE 
-                    SCU.SerialNumber = %s
-                    AND ASCL.StartDate <= FROM_UNIXTIME(%s)
-                    AND (ASCL.EndDate IS NULL OR ASCL.EndDate >= FROM_UNIXTIME(%s)); # noqa
-            """
-            result = self.execute_query(query, (cube_id, timestamp, timestamp),
-                                        fetchone=True)
+            result = self.execute_query(
+                _SQL_AIRCRAFT_UID_AND_NAME_BY_CUBEID,
+                (cube_id, timestamp, timestamp), fetchone=True)
 
             if not result:
                 logger.info(f"FALIED: No aircraft found for CubeID: {cube_id}")
                 return None
 
-            return result[0]
+            aircraft = (result[0], result[1])
+            self._lookup_cache.put(cache_key, aircraft)
+            return aircraft
         except Exception as e:
             logger.error(f"Error retrieving aircraft- CubeID {cube_id}: {e}")
             return None
 
+    def get_aircraft_uid_from_cubeid(self, cube_id: str,
+                                     timestamp: str) -> Optional[str]:
+        """
+        Retrieve the aircraft UID based on the CubeID and timestamp.
+
+        :param cube_id: The unique identifier of the Cube.
+        :param timestamp: The timestamp of the log.
+        :return: The UID of the aircraft, or None if not found.
+        """
+        aircraft = self.get_aircraft_uid_and_name_from_cubeid(cube_id,
+                                                              timestamp)
+        return aircraft[0] if aircraft else None
+
     def get_aircraft_name_from_cubeid(self, cube_id: str,
                                       timestamp: str) -> Optional[str]:
         """
@@ -412,34 +996,9 @@ class AuroraHandler:
         :param timestamp: The timestamp of the log.
         :return: The name of the aircraft, or None if not found.
         """
-        try:
-            query = """
-                SELECT 
-                    AT.AircraftName
-                FROM 
-                    AircraftSubComponentLink AS ASCL
-                JOIN 
-                    SubComponentUnits AS SCU
-                    ON ASCL.SubComponentUnitID = SCU.UID
-                JOIN
-                    AircraftTable AS AT
-                    ON ASCL.AircraftID = AT.UID
-                WHERE 
-                    SCU.SerialNumber = %s
-                    AND ASCL.StartDate <= FROM_UNIXTIME(%s)
-                    AND (ASCL.EndDate IS NULL OR ASCL.EndDate >= FROM_UNIXTIME(%s));  # noqa
-            """
-            result = self.execute_query(query, (cube_id, timestamp, timestamp),
-                                        fetchone=True)
-
-            if not result:
-                logger.info(f"FALIED: No aircraft found for CubeID: {cube_id}")
-                return None
-
-            return result[0]
-        except Exception as e:
-            logger.error(f"Error retrieving aircraft- CubeID {cube_id}: {e}")
-            return None
+        aircraft = self.get_aircraft_uid_and_name_from_cubeid(cube_id,
+                                                              timestamp)
+        return aircraft[1] if aircraft else None
 
     def get_aircraft_row_by_cubeid(self, cube_id: str,
                                    timestamp: str) -> Optional[Dict[str, Any]]:
@@ -451,37 +1010,14 @@ class AuroraHandler:
         :return: A dictionary containing the full row AircraftTable, or None.
         """
         try:
-            query = """
-                SELECT 
-                    AT.*
-                FROM 
-                    AircraftSubComponentLink AS ASCL
-                JOIN 
-                    SubComponentUnits AS SCU
-                    ON ASCL.SubComponentUnitID = SCU.UID
-                JOIN
-                    AircraftTable AS AT
-                    ON ASCL.AircraftID = AT.UID
-                WHERE 
-                    SCU.SerialNumber = %s
-                    AND ASCL.StartDate <= FROM_UNIXTIME(%s)
-                    AND (ASCL.EndDate IS NULL OR ASCL.EndDate >= FROM_UNIXTIME(%s));   # noqa
-            """
-            # Execute the query and fetch the result
-            result = self.execute_query(query, (cube_id, timestamp, timestamp),
-                                        fetchone=True)
+            row_dict = self.execute_query(
+                _SQL_AIRCRAFT_ROW_BY_CUBEID, (cube_id, timestamp, timestamp),
+                fetchone=True, dict_rows=True)
 
-            if not result:
+            if not row_dict:
                 logger.info(f"FAILED: No aircraft found for CubeID: {cube_id}")
                 return None
 
-            # Get column names from the cursor description
-            with self.connection.cursor() as cursor:
-                cursor.execute(query, (cube_id, timestamp, timestamp))
-                column_names = [desc[0] for desc in cursor.description]
-
-            # Combine column names and result values into a dictionary
-            row_dict = dict(zip(column_names, result))
             return row_dict
 
         except Exception as e:
@@ -489,12 +1025,20 @@ class AuroraHandler:
                          f" {cube_id}: {e}")
             return None
 
-    def __del__(self):
-        """Destructor to ensure the connection is closed."""
+    def __enter__(self) -> 'AuroraHandler':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Release the connection back to the pool."""
         self.close_connection()
 
 
 if __name__ == "__main__":
+    import random
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
     logging.info("Starting AuroraHandler test")
     logger.setLevel(logging.DEBUG)
 
@@ -512,19 +1056,20 @@ if __name__ == "__main__":
         logger.error("Missing required environment variables.")
         exit(1)
 
-    db_handler = AuroraHandler(DB_CREDENTIALS)
-    if not db_handler.init_state:
-        logger.error("Failed to initialize AuroraHandler")
-
-    # testing reconnection
-    while True:
-        if db_handler.connected():
-            result = db_handler.get_aircraft_name_from_cubeid(
-                '001F003A 34305107 35383431', '1732066788.992812')
-            logger.debug(f"Result: {result}")
-            break
-        else:
+    with AuroraHandler(DB_CREDENTIALS) as db_handler:
+        if not db_handler.init_state:
+            logger.error("Failed to initialize AuroraHandler")
+
+        # testing reconnection, with capped exponential backoff and jitter
+        MAX_RETRIES = 6
+        for attempt in range(MAX_RETRIES):
+            if db_handler.connected():
+                result = db_handler.get_aircraft_name_from_cubeid(
+                    '001F003A 34305107 35383431', '1732066788.992812')
+                logger.debug(f"Result: {result}")
+                break
             logger.error("Database connection failed.")
+            time.sleep(min(30, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5))
             DB_CREDENTIALS = {
                 'host': os.getenv('DB_HOST'),
                 'username': os.getenv('DB_USERNAME'),
@@ -536,20 +1081,23 @@ if __name__ == "__main__":
             }
             db_handler.db_credentials = DB_CREDENTIALS
             db_handler.reconnect()
-
-    result = db_handler.get_aircraft_uid_from_cubeid(
-        '001F003A 34305107 35383431', '1732066788.992812')
-    logger.debug(f"Result: {result}")
-    logger.debug(f"Result: {result}")
-    result = db_handler.get_aircraft_row_by_cubeid(
-        '001F003A 34305107 35383431', '1732066788.992812')
-    logger.debug(f"Result: {result}")
-    result = db_handler.get_aircraft_row_by_cubeid(
-        '004A002B 34395106 35333839', '1638835117.593511')
-    logger.debug(f"Result: {result}")
-    result = db_handler.log_exists(
-        '546d6435f057ec5c90880286390203a9833657c3c7ea6112bded2ac1d78e8b02')
-    logger.debug(f"Result: {result}")
-    result = db_handler.get_aircraft_row_by_cubeid(
-        '001F003A 34305107 35383431', '1732066788.992812')
-    logger.debug(f"Result: {result}")
+        else:
+            logger.error(f"No connection after {MAX_RETRIES} attempts")
+            exit(1)
+
+        result = db_handler.get_aircraft_uid_from_cubeid(
+            '001F003A 34305107 35383431', '1732066788.992812')
+        logger.debug(f"Result: {result}")
+        logger.debug(f"Result: {result}")
+        result = db_handler.get_aircraft_row_by_cubeid(
+            '001F003A 34305107 35383431', '1732066788.992812')
+        logger.debug(f"Result: {result}")
+        result = db_handler.get_aircraft_row_by_cubeid(
+            '004A002B 34395106 35333839', '1638835117.593511')
+        logger.debug(f"Result: {result}")
+        result = db_handler.log_exists(
+            '546d6435f057ec5c90880286390203a9833657c3c7ea6112bded2ac1d78e8b02')
+        logger.debug(f"Result: {result}")
+        result = db_handler.get_aircraft_row_by_cubeid(
+            '001F003A 34305107 35383431', '1732066788.992812')
+        logger.debug(f"Result: {result}")
@@ -1,16 +1,24 @@
 import logging
-from typing import Optional, Dict
-import boto3
+import time
+from typing import Optional, Dict, Tuple
 from botocore.exceptions import ClientError
 
+from carbonix_aws_libs._aws import _get_client
+
 logger = logging.getLogger(__name__)
 
+# How long (seconds) a crawler status is reused, so a tight polling loop
+# does not call the Glue API on every check.
+STATUS_CACHE_TTL = 5
+
 
 class GlueCrawlerHandler:
     def __init__(self, crawler_name: str,
                  region_name: Optional[str] = 'ap-southeast-2'):
-        self.glue_client = boto3.client('glue', region_name=region_name)
+        self.glue_client = _get_client('glue', region_name)
         self.crawler_name = crawler_name
+        # Crawler statuses with the time they were fetched, by crawler name.
+        self._statuses: Dict[str, Tuple[float, str]] = {}
 
     def start_crawler(self) -> Optional[Dict[str, str]]:
         """
@@ -21,6 +29,7 @@ class GlueCrawlerHandler:
         try:
             response = self.glue_client.start_crawler(Name=self.crawler_name)
             logger.debug(f"Triggered the crawler: {self.crawler_name}")
+            self._statuses.pop(self.crawler_name, None)
             return response
         except ClientError as e:
             logger.debug(f"Error triggering the crawler: {e}")
@@ -30,25 +39,34 @@ class GlueCrawlerHandler:
         """
         Get the status of the AWS Glue crawler.
 
+        A status fetched less than STATUS_CACHE_TTL seconds ago is reused.
+
         :return: Status of the crawler or None if an error occurs.
         """
+        cached = self._statuses.get(crawler_name)
+        if cached and time.monotonic() - cached[0] < STATUS_CACHE_TTL:
+            return cached[1]
         try:
             response = self.glue_client.get_crawler(Name=crawler_name)
             status = response['Crawler']['State']
             logger.debug(f"Crawler {crawler_name} status: {status}")
+            self._statuses[crawler_name] = (time.monotonic(), status)
             return status
         except ClientError as e:
             logger.debug(f"Error getting the crawler status: {e}")
             return None
 
+    def _status(self) -> Optional[str]:
+        """The status of this handler's crawler."""
+        return self.get_crawler_status(self.crawler_name)
+
     def is_crawler_running(self) -> bool:
         """
         Check if the AWS Glue crawler is currently running.
 
         :return: True if the crawler is running, False otherwise.
         """
-        status = self.get_crawler_status(self.crawler_name)
-        return status == 'RUNNING'
+        return self._status() == 'RUNNING'
 
     def is_crawler_completed(self) -> bool:
         """
@@ -56,5 +74,39 @@ class GlueCrawlerHandler:
 
         :return: True if the crawler has completed, False otherwise.
         """
-        status = self.get_crawler_status(self.crawler_name)
-        return status == 'READY'
+        return self._status() == 'READY'
+
+    def wait_until_ready(self, timeout: float, initial: float = 1.0,
+                         max_interval: float = 30.0) -> Optional[str]:
+        """
+        Wait for the AWS Glue crawler to finish its run.
+
+        The crawler is polled at once, then after initial seconds and at an
+        interval that doubles each time up to max_interval, so a quick crawl
+        is noticed soon and a long one makes few API calls. A crawler that
+        is STOPPING is still finishing, so polling goes on until it is
+        READY again.
+
+        :return: The status of the last crawl, SUCCEEDED, FAILED or
+            CANCELLED, or None on timeout or if an error occurs.
+        """
+        deadline = time.monotonic() + timeout
+        interval = initial
+        while True:
+            try:
+                crawler = self.glue_client.get_crawler(
+                    Name=self.crawler_name)['Crawler']
+            except ClientError as e:
+                logger.debug(f"Error getting the crawler status: {e}")
+                return None
+            self._statuses[self.crawler_name] = (time.monotonic(),
+                                                 crawler['State'])
+            if crawler['State'] == 'READY':
+                return crawler.get('LastCrawl', {}).get('Status')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.debug(f"Timed out waiting for the crawler: "
+                             f"{self.crawler_name}")
+                return None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, max_interval)
@@ -1,22 +1,112 @@
+import itertools
 import logging
 import os
+import posixpath
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, Optional
+from functools import cached_property
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
 
-import boto3
-from botocore.exceptions import NoCredentialsError
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.exceptions import ClientError, NoCredentialsError
+from s3transfer.subscribers import BaseSubscriber
+
+from carbonix_aws_libs._aws import _get_client
 
 logger = logging.getLogger(__name__)
 
+# Number of requests upload_directory_s3 has in flight at once.
+UPLOAD_WORKERS = 32
+# Files from this size (bytes) are sent as multipart uploads, in parts of
+# the same size.
+MULTIPART_CHUNKSIZE = 64 * 1024 * 1024
+# CopyObject copies files of up to 5 GiB; larger ones are copied in parts
+# of MULTIPART_CHUNKSIZE, which S3 copies in parallel.
+COPY_OBJECT_LIMIT = 5 * 1024 ** 3
+COPY_CONFIG = TransferConfig(max_concurrency=16,
+                             multipart_threshold=MULTIPART_CHUNKSIZE,
+                             multipart_chunksize=MULTIPART_CHUNKSIZE)
+# Headers of a file that a multipart copy does not carry over, unlike
+# CopyObject, so they are read from the source and set explicitly.
+MULTIPART_COPY_HEADERS = ('CacheControl', 'ContentDisposition',
+                          'ContentEncoding', 'ContentLanguage',
+                          'ContentType', 'Expires', 'Metadata')
+# Files from 8 MiB are downloaded as parallel ranged GETs of 16 MiB.
+DOWNLOAD_CONFIG = TransferConfig(max_concurrency=16,
+                                 multipart_threshold=8 * 1024 * 1024,
+                                 multipart_chunksize=16 * 1024 * 1024)
+# Number of objects exists_many and get_metadata_many check at once.
+HEAD_WORKERS = 32
+# Number of files upload_unprocessed_s3_batch copies at once.
+MOVE_WORKERS = 16
+# DeleteObjects accepts at most 1000 keys per call.
+DELETE_OBJECTS_LIMIT = 1000
+# Number of folders listed at once by the bucket listings.
+LIST_WORKERS = 16
+
+
+def _walk_files(path: str) -> Iterator[str]:
+    """Yield the paths of the files under a directory, as os.walk would."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_files(entry.path)
+            elif entry.is_file():
+                yield entry.path
+
+
+class _TransferSize(BaseSubscriber):
+    """Tell a transfer the size of its object, so it need not HEAD it."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def on_queued(self, future, **kwargs):
+        future.meta.provide_transfer_size(self.size)
+
 
 class S3Handler:
     def __init__(self, aws_region: str = "ap-southeast-2"):
         """Initialize the S3 handler with a given AWS region."""
         logger.debug("Initializing S3Handler...")
-        self.s3_client = boto3.client('s3', region_name=aws_region)
-        self.s3_resource = boto3.resource('s3', region_name=aws_region)
+        self.aws_region = aws_region
         logger.info("S3Handler initialized.")
 
+    @cached_property
+    def s3_client(self) -> Any:
+        """The shared S3 client of the region, created on first use."""
+        return _get_client('s3', self.aws_region)
+
+    @cached_property
+    def copy_manager(self) -> Any:
+        """
+        The transfer manager of the multipart copies of this handler.
+
+        It is created on first use and shut down by close(). Concurrent
+        copies of the handler share its COPY_CONFIG threads instead of each
+        starting their own.
+        """
+        return create_transfer_manager(self.s3_client, COPY_CONFIG)
+
+    def close(self) -> None:
+        """
+        Shut down copy_manager and its threads, if it was created.
+
+        The handler can still be used afterwards; a later multipart copy
+        creates a new manager.
+        """
+        manager = self.__dict__.pop('copy_manager', None)
+        if manager is not None:
+            manager.shutdown()
+
+    def __enter__(self) -> 'S3Handler':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Shut down copy_manager, see close."""
+        self.close()
+
     def get_s3_file_metadata(self, bucket_name: str, object_key: str
                              ) -> Optional[Dict[str, str]]:
         """
@@ -27,85 +117,151 @@ class S3Handler:
                 Bucket=bucket_name, Key=object_key)
             metadata = response.get('Metadata', {})
             return metadata
-        except self.s3_client.exceptions.NoSuchKey:
-            logger.error(
-                f"The object {object_key} does not exist in {bucket_name}.")
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                logger.error("The object %s does not exist in %s.",
+                             object_key, bucket_name)
+            else:
+                logger.error("Error retrieving metadata: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Error retrieving metadata: {e}")
+            logger.error("Error retrieving metadata: %s", e)
             return None
 
+    def get_metadata_many(self, bucket_name: str, object_keys: List[str],
+                          max_workers: int = HEAD_WORKERS
+                          ) -> Dict[str, Optional[Dict[str, str]]]:
+        """
+        Get the metadata of several S3 files, up to max_workers at a time.
+
+        :return: The metadata by key, None for a key that could not be read.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(object_keys, executor.map(
+                lambda key: self.get_s3_file_metadata(bucket_name, key),
+                object_keys)))
+
     def copy_file_s3_to_s3(self, source_bucket: str, source_key: str,
-                           destination_bucket: str, destination_key: str
-                           ) -> bool:
+                           destination_bucket: str, destination_key: str,
+                           size: Optional[int] = None) -> bool:
         """
         Copy a file from one S3 bucket to another.
+
+        Files up to COPY_OBJECT_LIMIT are copied with a single CopyObject,
+        which keeps their metadata, headers and tags. Larger files are
+        copied in parts, see _copy_multipart. A file of unknown size is
+        tried with CopyObject first, since S3 rejects a source that is too
+        large before copying anything.
+
+        :param size: The size of the file in bytes, if known.
         """
+        copy_source = {"Bucket": source_bucket, "Key": source_key}
         try:
-            logger.debug(
-                f"Copying {source_key} from {source_bucket} to "
-                f"{destination_bucket}/{destination_key}")
-            self.s3_client.copy_object(
-                CopySource={"Bucket": source_bucket, "Key": source_key},
-                Bucket=destination_bucket,
-                Key=destination_key
-            )
-            logger.info(f"Copied {source_key} to "
-                        f"{destination_bucket}/{destination_key}")
+            logger.debug("Copying %s from %s to %s/%s",
+                         source_key, source_bucket, destination_bucket,
+                         destination_key)
+            if size is not None and size > COPY_OBJECT_LIMIT:
+                self._copy_multipart(copy_source, destination_bucket,
+                                     destination_key)
+            else:
+                try:
+                    self.s3_client.copy_object(
+                        CopySource=copy_source, Bucket=destination_bucket,
+                        Key=destination_key, MetadataDirective="COPY")
+                except ClientError as e:
+                    if (size is not None or
+                            e.response['Error']['Code'] != 'InvalidRequest'):
+                        raise
+                    self._copy_multipart(copy_source, destination_bucket,
+                                         destination_key)
+            logger.info("Copied %s to %s/%s",
+                        source_key, destination_bucket, destination_key)
             return True
         except NoCredentialsError:
             logger.error("S3 Credentials not available")
             return False
         except Exception as e:
-            logger.error(f"Error copying file from S3 to S3: {e}")
+            logger.error("Error copying file from S3 to S3: %s", e)
             return False
 
+    def _copy_multipart(self, copy_source: Dict[str, str],
+                        destination_bucket: str,
+                        destination_key: str) -> None:
+        """
+        Copy a file in parts through copy_manager.
+
+        A multipart copy starts a new object, so the MULTIPART_COPY_HEADERS
+        and tags of the source are read and set on it explicitly.
+        """
+        head = self.s3_client.head_object(**copy_source)
+        extra_args = {name: head[name] for name in MULTIPART_COPY_HEADERS
+                      if name in head}
+        tags = self.s3_client.get_object_tagging(**copy_source)['TagSet']
+        if tags:
+            extra_args['Tagging'] = urlencode(
+                [(tag['Key'], tag['Value']) for tag in tags])
+        self.copy_manager.copy(
+            copy_source, destination_bucket, destination_key,
+            extra_args=extra_args,
+            subscribers=[_TransferSize(head['ContentLength'])]).result()
+
     def download_file_s3(self, bucket_name: str, object_key: str,
                          download_path: str) -> bool:
         """
         Download a file from S3 to a local path.
         """
         try:
-            logger.debug(
-                f"Downloading {object_key} from {bucket_name} "
-                f"to {download_path}")
+            logger.debug("Downloading %s from %s to %s",
+                         object_key, bucket_name, download_path)
             self.s3_client.download_file(
-                bucket_name, object_key, download_path)
-            logger.info(f"Downloaded {object_key} to {download_path}")
+                bucket_name, object_key, download_path,
+                Config=DOWNLOAD_CONFIG)
+            logger.info("Downloaded %s to %s", object_key, download_path)
             return True
         except NoCredentialsError:
             logger.error("S3 Credentials not available")
             return False
         except Exception as e:
-            logger.error(f"Error downloading file from S3: {e}")
+            logger.error("Error downloading file from S3: %s", e)
             return False
 
     def upload_directory_s3(self, directory_path: str, bucket_name: str,
-                            s3_prefix: str = "") -> bool:
+                            s3_prefix: str = "",
+                            max_workers: int = UPLOAD_WORKERS) -> bool:
         """
         Upload the contents of a local directory to an S3 bucket.
+
+        The files are uploaded through one transfer manager, with up to
+        max_workers requests in flight. On the first failure the uploads not
+        yet done are cancelled.
         """
-        logger.debug(
-            f"Uploading contents of {directory_path} to "
-            f"{bucket_name}/{s3_prefix}")
-        for root, _, files in os.walk(directory_path):
-            for filename in files:
-                local_path = os.path.join(root, filename)
-                relative_path = os.path.relpath(local_path, directory_path)
-                s3_path = os.path.join(
-                    s3_prefix, relative_path).replace("\\", "/")
-                try:
-                    self.s3_client.upload_file(
-                        local_path, bucket_name, s3_path)
-                except NoCredentialsError:
-                    logger.error("S3 Credentials not available")
-                    return False
-                except Exception as e:
-                    logger.error(f"Error uploading file to S3: {e}")
-                    return False
-        logger.info(
-            f"Uploaded contents of {directory_path} to "
-            f"{bucket_name}/{s3_prefix}")
+        logger.debug("Uploading contents of %s to %s/%s",
+                     directory_path, bucket_name, s3_prefix)
+        base = os.path.join(os.path.abspath(directory_path), "")
+        files = []
+        for local_path in _walk_files(base):
+            relative_path = local_path[len(base):].replace(os.sep, "/")
+            files.append(
+                (local_path, posixpath.join(s3_prefix, relative_path)))
+
+        config = TransferConfig(max_concurrency=max_workers,
+                                multipart_threshold=MULTIPART_CHUNKSIZE,
+                                multipart_chunksize=MULTIPART_CHUNKSIZE)
+        try:
+            # Leaving the manager on an error cancels the pending uploads.
+            with create_transfer_manager(self.s3_client, config) as manager:
+                futures = [manager.upload(local_path, bucket_name, s3_path)
+                           for local_path, s3_path in files]
+                for future in futures:
+                    future.result()
+        except NoCredentialsError:
+            logger.error("S3 Credentials not available")
+            return False
+        except Exception as e:
+            logger.error("Error uploading file to S3: %s", e)
+            return False
+        logger.info("Uploaded contents of %s to %s/%s",
+                    directory_path, bucket_name, s3_prefix)
         return True
 
     def upload_file_s3(self, file_path: str, bucket_name: str,
@@ -114,33 +270,59 @@ class S3Handler:
         Upload a file to an S3 bucket.
         """
         try:
-            logger.debug(
-                f"Uploading {file_path} to {bucket_name}/{object_key}")
+            logger.debug("Uploading %s to %s/%s",
+                         file_path, bucket_name, object_key)
             self.s3_client.upload_file(file_path, bucket_name, object_key)
-            logger.info(f"Uploaded {file_path} to {bucket_name}/{object_key}")
+            logger.info("Uploaded %s to %s/%s",
+                        file_path, bucket_name, object_key)
             return True
         except NoCredentialsError:
             logger.error("S3 Credentials not available")
             return False
         except Exception as e:
-            logger.error(f"Error uploading file to S3: {e}")
+            logger.error("Error uploading file to S3: %s", e)
             return False
 
     def delete_file_s3(self, bucket_name: str, object_key: str) -> bool:
         """
         Delete a file from an S3 bucket.
         """
-        try:
-            logger.debug(f"Deleting {object_key} from {bucket_name}")
-            self.s3_client.delete_object(Bucket=bucket_name, Key=object_key)
-            logger.info(f"Deleted {object_key} from {bucket_name}")
-            return True
-        except NoCredentialsError:
-            logger.error("S3 Credentials not available")
-            return False
-        except Exception as e:
-            logger.error(f"Error deleting file from S3: {e}")
-            return False
+        return self.delete_files_s3(bucket_name, [object_key])
+
+    def delete_files_s3(self, bucket_name: str,
+                        object_keys: List[str]) -> bool:
+        """
+        Delete several files from an S3 bucket.
+
+        The keys are deleted with DeleteObjects, up to 1000 per call.
+
+        :return: True if every file was deleted, False otherwise.
+        """
+        success = True
+        for i in range(0, len(object_keys), DELETE_OBJECTS_LIMIT):
+            chunk = object_keys[i:i + DELETE_OBJECTS_LIMIT]
+            try:
+                logger.debug("Deleting %s files from %s",
+                             len(chunk), bucket_name)
+                response = self.s3_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in chunk],
+                            'Quiet': True})
+            except NoCredentialsError:
+                logger.error("S3 Credentials not available")
+                return False
+            except Exception as e:
+                logger.error("Error deleting files from S3: %s", e)
+                success = False
+                continue
+            for error in response.get('Errors', []):
+                logger.error("Error deleting %s from S3: %s",
+                             error['Key'], error.get('Message'))
+                success = False
+        if success:
+            logger.info("Deleted %s files from %s",
+                        len(object_keys), bucket_name)
+        return success
 
     def check_s3_item_exists(self, bucket_name: str, item_name: str) -> bool:
         """
@@ -150,73 +332,181 @@ class S3Handler:
         try:
             # Check if the item is a file
             if not item_name.endswith('/'):
-                try:
-                    self.s3_client.head_object(Bucket=bucket_name,
-                                               Key=item_name)
-                    return True
-                except self.s3_client.exceptions.ClientError as e:
-                    if e.response['Error']['Code'] == '404':
-                        logger.debug(f"The object {item_name} does not "
-                                     f"exist in bucket {bucket_name}.")
-                        return False
-                    else:
-                        logger.error(f"Error checking item existence: {e}")
-                        raise False
+                self.s3_client.head_object(Bucket=bucket_name, Key=item_name)
+                return True
 
             # If the item_name ends with '/', check for a folder
-            bucket = self.s3_resource.Bucket(bucket_name)
-            objs = bucket.objects.filter(Prefix=item_name, MaxKeys=1)
-            return any(obj.key.startswith(item_name) for obj in objs)
+            response = self.s3_client.list_objects_v2(
+                Bucket=bucket_name, Prefix=item_name, MaxKeys=1)
+            return response.get('KeyCount', 0) > 0
 
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                logger.debug("The object %s does not exist in bucket %s.",
+                             item_name, bucket_name)
+            else:
+                logger.error("Error checking item existence in S3: %s", e)
+            return False
         except Exception as e:
-            logger.error(f"Error checking item existence in S3: {e}")
+            logger.error("Error checking item existence in S3: %s", e)
             return False
 
+    def exists_many(self, bucket_name: str, item_names: List[str],
+                    max_workers: int = HEAD_WORKERS) -> Dict[str, bool]:
+        """
+        Check if several files or folders exist in an S3 bucket.
+
+        Each item is checked as by check_s3_item_exists, up to max_workers
+        at a time.
+
+        :return: Whether each item exists, by item name.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(item_names, executor.map(
+                lambda item: self.check_s3_item_exists(bucket_name, item),
+                item_names)))
+
     def upload_unprocessed_s3(self, source_bucket: str, source_key: str,
                               unprocessed_destination_bucket: str,
                               s3_prefix: str = "NoCategory") -> bool:
         """
         Upload a file to an S3 bucket and move it to an unprocessed folder.
         """
-        current_timestamp_str = datetime.now().strftime("%Y%m%d-%H%M%S")
-        destination_key = f"{s3_prefix}/{current_timestamp_str}/{source_key}"
+        return self.upload_unprocessed_s3_batch(
+            source_bucket, [source_key], unprocessed_destination_bucket,
+            s3_prefix)
 
-        if self.copy_file_s3_to_s3(source_bucket, source_key,
-                                   unprocessed_destination_bucket,
-                                   destination_key):
-            return self.delete_file_s3(source_bucket, source_key)
+    def upload_unprocessed_s3_batch(self, source_bucket: str,
+                                    source_keys: List[str],
+                                    unprocessed_destination_bucket: str,
+                                    s3_prefix: str = "NoCategory",
+                                    max_workers: int = MOVE_WORKERS,
+                                    source_sizes: Optional[
+                                        Dict[str, int]] = None) -> bool:
+        """
+        Move several files to an unprocessed folder of an S3 bucket.
 
-        return False
-    
-    def list_s3_folders(self, bucket_name: str) -> list:
+        The files are copied in parallel, up to max_workers at a time, all
+        under the same timestamp folder. The ones that were copied are then
+        deleted from the source with DeleteObjects, up to 1000 per call.
+
+        :param source_sizes: The sizes of the files by key, if known, e.g.
+        from list_s3_files_and_size; see copy_file_s3_to_s3.
+        :return: True if every file was moved, False otherwise.
+        """
+        current_timestamp_str = datetime.now().strftime("%Y%m%d-%H%M%S")
+        source_sizes = source_sizes or {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            copied = list(executor.map(
+                lambda source_key: self.copy_file_s3_to_s3(
+                    source_bucket, source_key,
+                    unprocessed_destination_bucket,
+                    f"{s3_prefix}/{current_timestamp_str}/{source_key}",
+                    source_sizes.get(source_key)),
+                source_keys))
+        copied_keys = [key for key, ok in zip(source_keys, copied) if ok]
+        return (self.delete_files_s3(source_bucket, copied_keys)
+                and len(copied_keys) == len(source_keys))
+
+    def list_s3_folders(self, bucket_name: str,
+                        max_workers: int = LIST_WORKERS) -> list:
         """
         List all folders in an S3 bucket.
+
+        Each folder is listed with a '/' delimiter, which returns its
+        subfolders without its objects, and every subfolder found is listed
+        in turn, up to max_workers at a time.
         """
         try:
-            bucket = self.s3_resource.Bucket(bucket_name)
             folders = set()
-            for obj in bucket.objects.all():
-                if obj.key.endswith('/'):
-                    folders.add(obj.key)
-                else:
-                    folder = '/'.join(obj.key.split('/')[:-1]) + '/'
-                    if folder != '/':
-                        folders.add(folder)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pending = {executor.submit(
+                    self._list_folder, bucket_name, "")}
+                while pending:
+                    done, pending = wait(pending,
+                                         return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for prefix in future.result()[1]:
+                            folders.add(prefix)
+                            pending.add(executor.submit(
+                                self._list_folder, bucket_name, prefix))
             return sorted(folders)
         except Exception as e:
-            logger.error(f"Error listing folders in '{bucket_name}': {e}")
+            logger.error("Error listing folders in '%s': %s", bucket_name, e)
             return []
 
+    def _list_folder(self, bucket_name: str, prefix: str
+                     ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """The objects directly in a folder, and its subfolders."""
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        objects = []
+        prefixes = []
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix,
+                                       Delimiter='/'):
+            objects.extend(page.get('Contents', []))
+            prefixes.extend(
+                p['Prefix'] for p in page.get('CommonPrefixes', []))
+        return objects, prefixes
+
+    def _list_objects(self, bucket_name: str, prefix: str = ""
+                      ) -> Iterator[Dict[str, Any]]:
+        """Yield the objects of a bucket under a prefix, a page at a time."""
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(
+                Bucket=bucket_name, Prefix=prefix,
+                PaginationConfig={'PageSize': 1000}):
+            yield from page.get('Contents', [])
+
+    def _list_all_objects(self, bucket_name: str,
+                          max_workers: int = LIST_WORKERS
+                          ) -> List[Dict[str, Any]]:
+        """
+        List every object of a bucket.
+
+        The top level is listed with a '/' delimiter, and then the top-level
+        folders are listed in parallel, so a large bucket is read as several
+        independent page sequences instead of one.
+        """
+        objects, prefixes = self._list_folder(bucket_name, "")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            objects.extend(itertools.chain.from_iterable(executor.map(
+                lambda prefix: list(self._list_objects(bucket_name, prefix)),
+                prefixes)))
+        return objects
+
+    def iter_s3_files(self, bucket_name: str,
+                      prefix: str = "") -> Iterator[str]:
+        """
+        Yield the files in an S3 bucket under a prefix, a page at a time.
+
+        Unlike list_s3_files this lists sequentially, but never holds more
+        than one page of keys.
+        """
+        try:
+            for obj in self._list_objects(bucket_name, prefix):
+                yield obj['Key']
+        except Exception as e:
+            logger.error("Error listing files in '%s': %s", bucket_name, e)
+
+    def iter_s3_files_and_size(self, bucket_name: str, prefix: str = ""
+                               ) -> Iterator[Tuple[str, int]]:
+        """
+        Yield the files in an S3 bucket under a prefix and their sizes.
+        """
+        try:
+            for obj in self._list_objects(bucket_name, prefix):
+                yield obj['Key'], obj['Size']
+        except Exception as e:
+            logger.error("Error listing files in '%s': %s", bucket_name, e)
+
     def list_s3_files(self, bucket_name: str) -> list:
         """
         List all files in an S3 bucket.
         """
         try:
-            bucket = self.s3_resource.Bucket(bucket_name)
-            files = [obj.key for obj in bucket.objects.all()]
-            return files
+            return [obj['Key'] for obj in self._list_all_objects(bucket_name)]
         except Exception as e:
-            logger.error(f"Error listing files in '{bucket_name}': {e}")
+            logger.error("Error listing files in '%s': %s", bucket_name, e)
             return []
 
     def list_s3_files_and_size(self, bucket_name: str) -> list:
@@ -224,13 +514,10 @@ class S3Handler:
         List all files in an S3 bucket and their sizes.
         """
         try:
-            bucket = self.s3_resource.Bucket(bucket_name)
-            files = []
-            for obj in bucket.objects.all():
-                files.append((obj.key, obj.size))
-            return files
+            return [(obj['Key'], obj['Size'])
+                    for obj in self._list_all_objects(bucket_name)]
         except Exception as e:
-            logger.error(f"Error listing files in '{bucket_name}': {e}")
+            logger.error("Error listing files in '%s': %s", bucket_name, e)
             return []
 
 
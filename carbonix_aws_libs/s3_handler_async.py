@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from typing import Any, Callable, Dict, List, Tuple
+
+import aioboto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, NoCredentialsError
+
+from carbonix_aws_libs._aws import S3_CLIENT_CONFIG
+from carbonix_aws_libs.s3_handler import DELETE_OBJECTS_LIMIT, S3Handler
+
+__all__ = ['AsyncS3Handler']
+
+logger = logging.getLogger(__name__)
+
+# Number of requests the *_many_async methods have in flight at once, and
+# pooled connections to match.
+ASYNC_CONCURRENCY = 256
+ASYNC_CLIENT_CONFIG = S3_CLIENT_CONFIG.merge(
+    Config(max_pool_connections=ASYNC_CONCURRENCY))
+
+
+class AsyncS3Handler(S3Handler):
+    """
+    S3Handler with asyncio variants of its per-object methods.
+
+    The *_async methods use aioboto3, so thousands of HEAD, copy and delete
+    requests can be outstanding on one event loop instead of a thread each.
+    They need the handler to be open:
+
+        async with AsyncS3Handler() as handler:
+            exists = await handler.exists_many_async(bucket, keys)
+
+    Synchronous code can call a single coroutine method through run(). The
+    synchronous S3Handler methods are inherited unchanged.
+    """
+
+    def __init__(self, aws_region: str = "ap-southeast-2"):
+        super().__init__(aws_region)
+        self.async_s3_client = None
+        self._exit_stack = None
+
+    async def __aenter__(self) -> 'AsyncS3Handler':
+        """Open the aioboto3 client used by the *_async methods."""
+        session = aioboto3.Session()
+        self._exit_stack = AsyncExitStack()
+        self.async_s3_client = await self._exit_stack.enter_async_context(
+            session.client('s3', region_name=self.aws_region,
+                           config=ASYNC_CLIENT_CONFIG))
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the aioboto3 client and shut down copy_manager."""
+        exit_stack, self._exit_stack = self._exit_stack, None
+        self.async_s3_client = None
+        self.close()
+        if exit_stack:
+            await exit_stack.aclose()
+
+    def run(self, method: Callable, *args, **kwargs) -> Any:
+        """
+        Run one of the *_async methods from synchronous code.
+
+        :param method: The coroutine method to run, e.g.
+        handler.exists_many_async.
+        :return: The result of the method.
+        """
+        async def runner():
+            async with self:
+                return await method(*args, **kwargs)
+        return asyncio.run(runner())
+
+    async def check_s3_item_exists_async(self, bucket_name: str,
+                                         item_name: str) -> bool:
+        """
+        Check if a file or folder exists in an S3 bucket.
+
+        See check_s3_item_exists.
+        """
+        try:
+            if not item_name.endswith('/'):
+                await self.async_s3_client.head_object(Bucket=bucket_name,
+                                                       Key=item_name)
+                return True
+
+            response = await self.async_s3_client.list_objects_v2(
+                Bucket=bucket_name, Prefix=item_name, MaxKeys=1)
+            return response.get('KeyCount', 0) > 0
+
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                logger.debug("The object %s does not exist in bucket %s.",
+                             item_name, bucket_name)
+            else:
+                logger.error("Error checking item existence in S3: %s", e)
+            return False
+        except Exception as e:
+            logger.error("Error checking item existence in S3: %s", e)
+            return False
+
+    async def exists_many_async(self, bucket_name: str, item_names: List[str],
+                                max_concurrency: int = ASYNC_CONCURRENCY
+                                ) -> Dict[str, bool]:
+        """
+        Check if several files or folders exist in an S3 bucket.
+
+        :return: Whether each item exists, by item name.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def check(item_name: str) -> bool:
+            async with semaphore:
+                return await self.check_s3_item_exists_async(bucket_name,
+                                                             item_name)
+
+        results = await asyncio.gather(*(check(item) for item in item_names))
+        return dict(zip(item_names, results))
+
+    async def copy_file_s3_to_s3_async(self, source_bucket: str,
+                                       source_key: str,
+                                       destination_bucket: str,
+                                       destination_key: str) -> bool:
+        """
+        Copy a file from one S3 bucket to another.
+
+        This is a single CopyObject, so unlike copy_file_s3_to_s3 it is
+        limited to objects of up to 5 GiB.
+        """
+        try:
+            await self.async_s3_client.copy_object(
+                CopySource={"Bucket": source_bucket, "Key": source_key},
+                Bucket=destination_bucket,
+                Key=destination_key,
+                MetadataDirective="COPY")
+            logger.debug("Copied %s to %s/%s",
+                         source_key, destination_bucket, destination_key)
+            return True
+        except NoCredentialsError:
+            logger.error("S3 Credentials not available")
+            return False
+        except Exception as e:
+            logger.error("Error copying file from S3 to S3: %s", e)
+            return False
+
+    async def copy_many_async(self, copies: List[Tuple[str, str, str, str]],
+                              max_concurrency: int = ASYNC_CONCURRENCY
+                              ) -> List[bool]:
+        """
+        Copy several files between S3 buckets.
+
+        :param copies: The (source_bucket, source_key, destination_bucket,
+        destination_key) of each copy.
+        :return: Whether each copy succeeded, in the order of copies.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def copy(args: Tuple[str, str, str, str]) -> bool:
+            async with semaphore:
+                return await self.copy_file_s3_to_s3_async(*args)
+
+        return list(await asyncio.gather(*(copy(args) for args in copies)))
+
+    async def delete_many_async(self, bucket_name: str,
+                                object_keys: List[str],
+                                max_concurrency: int = ASYNC_CONCURRENCY
+                                ) -> bool:
+        """
+        Delete several files from an S3 bucket.
+
+        The keys are deleted with concurrent DeleteObjects calls of up to
+        1000 keys each.
+
+        :return: True if every file was deleted, False otherwise.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def delete(chunk: List[str]) -> bool:
+            async with semaphore:
+                try:
+                    response = await self.async_s3_client.delete_objects(
+                        Bucket=bucket_name,
+                        Delete={'Objects': [{'Key': key} for key in chunk],
+                                'Quiet': True})
+                except Exception as e:
+                    logger.error("Error deleting files from S3: %s", e)
+                    return False
+                for error in response.get('Errors', []):
+                    logger.error("Error deleting %s from S3: %s",
+                                 error['Key'], error.get('Message'))
+                return not response.get('Errors')
+
+        results = await asyncio.gather(*(
+            delete(object_keys[i:i + DELETE_OBJECTS_LIMIT])
+            for i in range(0, len(object_keys), DELETE_OBJECTS_LIMIT)))
+        return all(results)
@@ -8,12 +8,16 @@ setup(
     long_description_content_type="text/markdown",
     author="Lokesh",
     url="https://github.com/CarbonixUAV/carbonix-aws-libs",
-    packages=find_packages(),
+    packages=find_packages(include=["carbonix_aws_libs", "carbonix_aws_libs.*"]),
     install_requires=[
         "boto3>=1.28.0",
         "pymysql>=1.0.0",
         "python-dotenv>=1.0.0"
     ],
+    extras_require={
+        "async": ["aioboto3>=11.0.0"],
+        "fast": ["orjson>=3.9.0"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",